@@ -0,0 +1,203 @@
+'''
+Micro-benchmarks of the tlccs hot paths, at the sizes used by the device.
+Runs without hardware and prints the results as JSON:
+
+    python -m benchmarks.bench_tlccs [--repeat 7] [--filter crc] [--output results.json]
+'''
+
+import argparse
+import array
+import json
+import platform
+import struct
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+from typing import Callable, Dict, List
+import numpy as np
+
+from thorlabs_ccs import tlccs
+from thorlabs_ccs.peaks import PeakDetector
+from thorlabs_ccs.resampling import SpectralResampler, RESAMPLING_AREA, uniform_grid
+from thorlabs_ccs.simulation import SimulatedCCS, synthesize_eeprom_image
+
+class FrameSource:
+    '''device returning the same raw frame on every bulk read, so that only decoding is timed'''
+
+    def __init__(self, frame: bytes):
+        self.frame = frame
+
+    def read(self, endpoint: int, size_or_buffer, timeout = None):
+
+        if isinstance(size_or_buffer, int):
+            return array.array('B', self.frame[:size_or_buffer])
+
+        buffer = memoryview(size_or_buffer).cast('B')
+        buffer[:len(self.frame)] = self.frame
+        return len(self.frame)
+
+def synthetic_firmware(num_records: int = 400, seed: int = 0) -> bytes:
+    '''.spt-like file: a header, then CSPT blocks writing contiguous RAM, framed by CPUCS hold/release'''
+
+    rng = np.random.default_rng(seed)
+
+    def block(bRequest: int, wValue: int, payload: bytes) -> bytes:
+        header = bytearray(32)
+        header[0:4] = b'CSPT'
+        struct.pack_into('<I', header, 4, 32 + len(payload))
+        header[16] = bRequest
+        struct.pack_into('<HH', header, 18, wValue, 0)
+        struct.pack_into('<H', header, 28, len(payload))
+        return bytes(header) + payload
+
+    blocks = [b'\0' * 256, block(0xA0, tlccs.EZUSB_CPUCS, b'\x01')]
+    address = 0
+    for i in range(num_records):
+        length = int(rng.choice([16, 32, 48]))
+        blocks.append(block(0xA0, address, rng.integers(0, 256, length, dtype=np.uint8).tobytes()))
+        address += length
+    blocks.append(block(0xA0, tlccs.EZUSB_CPUCS, b'\x00'))
+    return b''.join(blocks)
+
+def make_fixtures() -> Dict[str, object]:
+
+    rng = np.random.default_rng(0)
+    amplitude_cor = rng.uniform(0.5, 3.0, tlccs.TLCCS_NUM_PIXELS).astype(np.float32)
+    sim = SimulatedCCS(
+        eeprom = synthesize_eeprom_image(amplitude_cor = amplitude_cor),
+        read_noise = 0,
+        seed = 0
+    )
+    data = tlccs.TLCCS_DATA()
+    tlccs.initialize(sim, data)
+
+    sim.int_time = 0.01
+    raw_frame = sim._frame(0.0).tobytes()
+
+    firmware_file = Path(tempfile.mkdtemp()) / 'synthetic.spt'
+    firmware_file.write_bytes(synthetic_firmware())
+
+    return {
+        'data': data,
+        'eeprom': tlccs.EEPROMImage.from_device(sim),
+        'dev': FrameSource(raw_frame),
+        'raw_frame': raw_frame,
+        'acor_bytes': amplitude_cor.astype('<f4').tobytes(),
+        'firmware_file': firmware_file,
+        'firmware_bytes': firmware_file.read_bytes(),
+        'int_time_bytes': tlccs.encode_integration_time(0.1234),
+        'center': tlccs.TLCCS_NUM_PIXELS // 2,
+    }
+
+def make_benchmarks(fx: Dict[str, object]) -> Dict[str, Callable[[], object]]:
+
+    data = fx['data']
+    dev = fx['dev']
+    plans = {
+        mode: tlccs.make_correction_plan(data, mode, *params)
+        for mode, params in (
+            (tlccs.CORRECTION_MODE_FACTORY, ()),
+            (tlccs.CORRECTION_MODE_RANGE, (400.0, 650.0)),
+            (tlccs.CORRECTION_MODE_NOISE, (531.78, 1.0)),
+        )
+    }
+    wl_cal = tlccs.TLCCS_WL_CAL(poly = data.factory_wavelength_cal.poly)
+    index = tlccs.RangeMinMaxIndex(data.user_amplitude_cal.amplitude_cor)
+    raw = tlccs.allocate_raw_buffer()
+    out = np.empty((tlccs.TLCCS_NUM_PIXELS,), dtype=np.float64)
+    out32 = np.empty((tlccs.TLCCS_NUM_PIXELS,), dtype=np.float32)
+    grid = uniform_grid(400.0, 650.0, 0.5)
+    linear = SpectralResampler(data.factory_wavelength_cal.wl, grid)
+    area = SpectralResampler(data.factory_wavelength_cal.wl, grid, mode = RESAMPLING_AREA)
+    batch = np.random.default_rng(0).random((64, tlccs.TLCCS_NUM_PIXELS))
+    detect = PeakDetector(data.factory_wavelength_cal.poly, relative_threshold = 0.5, min_distance = 5)
+    frames = np.tile(tlccs.decode_scan_data(fx['raw_frame']), (64, 1))
+
+    return {
+        'decode_scan_data': lambda: tlccs.decode_scan_data(fx['raw_frame']),
+        'get_scan_data': lambda: tlccs.get_scan_data(dev, data),
+        'get_scan_data_array': lambda: tlccs.get_scan_data(dev, data, as_ndarray=False),
+        'get_scan_data_factory': lambda: tlccs.get_scan_data_factory(dev, data),
+        'get_scan_data_corrected_range': lambda: tlccs.get_scan_data_corrected_range(dev, data, 400.0, 650.0),
+        'get_scan_data_corrected_noise': lambda: tlccs.get_scan_data_corrected_noise(dev, data, 531.78, 1.0),
+        'get_scan_data_factory_planned': lambda: tlccs.get_scan_data_factory(
+            dev, data, plan = plans[tlccs.CORRECTION_MODE_FACTORY]),
+        'get_scan_data_corrected_range_planned': lambda: tlccs.get_scan_data_corrected_range(
+            dev, data, 400.0, 650.0, plan = plans[tlccs.CORRECTION_MODE_RANGE]),
+        'get_scan_data_corrected_noise_planned': lambda: tlccs.get_scan_data_corrected_noise(
+            dev, data, 531.78, 1.0, plan = plans[tlccs.CORRECTION_MODE_NOISE]),
+        'get_scan_data_factory_buffers': lambda: tlccs.get_scan_data_factory(
+            dev, data, plan = plans[tlccs.CORRECTION_MODE_FACTORY], raw = raw, out = out),
+        'get_scan_data_factory_buffers_float32': lambda: tlccs.get_scan_data_factory(
+            dev, data, plan = plans[tlccs.CORRECTION_MODE_FACTORY], raw = raw, out = out32),
+        'get_calibration': lambda: tlccs.get_calibration(fx['eeprom'], tlccs.TLCCS_DATA()),
+        'crc16_block_acor': lambda: tlccs.crc16_block(fx['acor_bytes'], tlccs.EE_LENGTH_ACOR),
+        'poly_to_wavelength_array': lambda: tlccs.poly_to_wavelength_array(wl_cal),
+        'poly_to_wavelength_array_uncached': lambda: (
+            tlccs._wavelength_cache.clear(), tlccs.poly_to_wavelength_array(wl_cal)),
+        'resample_linear': lambda: linear(batch[0]),
+        'resample_linear_batch64': lambda: linear(batch),
+        'resample_area_batch64': lambda: area(batch),
+        'np_interp_batch64': lambda: [np.interp(grid, linear.wavelength, spectrum) for spectrum in batch],
+        'detect_peaks_batch64': lambda: detect(frames),
+        'encode_integration_time': lambda: tlccs.encode_integration_time(0.1234),
+        'decode_integration_time': lambda: tlccs.decode_integration_time(fx['int_time_bytes']),
+        'find_centered_range': lambda: tlccs.find_centered_range(
+            data.user_amplitude_cal.amplitude_cor, fx['center'], 2.0),
+        'find_centered_range_indexed': lambda: tlccs.find_centered_range(
+            data.user_amplitude_cal.amplitude_cor, fx['center'], 2.0, index = index),
+        'parse_spt_bytes': lambda: tlccs.parse_spt_bytes(fx['firmware_bytes']),
+        'parse_spt_cached': lambda: tlccs.parse_spt(fx['firmware_file']),
+        'coalesce_firmware_records': lambda: tlccs.coalesce_firmware_records(
+            tlccs.parse_spt(fx['firmware_file'])),
+    }
+
+def run_benchmark(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    timings = [t / number for t in timer.repeat(repeat = repeat, number = number)]
+    return {
+        'number': number,
+        'repeat': repeat,
+        'best_us': min(timings) * 1e6,
+        'median_us': float(np.median(timings)) * 1e6,
+        'mean_us': float(np.mean(timings)) * 1e6,
+    }
+
+def run(repeat: int = 7, filters: List[str] = ()) -> Dict[str, object]:
+
+    benchmarks = make_benchmarks(make_fixtures())
+    results = {}
+    for name, fn in benchmarks.items():
+        if filters and not any(f in name for f in filters):
+            continue
+        results[name] = run_benchmark(fn, repeat)
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+def main(argv = None) -> None:
+
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type = int, default = 7, help = 'number of timing runs per benchmark')
+    parser.add_argument('--filter', action = 'append', default = [], help = 'only run benchmarks containing this string')
+    parser.add_argument('--output', type = Path, help = 'write the JSON report to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    report = json.dumps(run(args.repeat, args.filter), indent = 2)
+    if args.output is None:
+        print(report)
+    else:
+        args.output.write_text(report + '\n')
+
+if __name__ == '__main__':
+    main()
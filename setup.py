@@ -4,7 +4,7 @@ setup(
     name='thorlabs_ccs',
     author='Martin Privat',
     version='0.2.29',
-    packages=['thorlabs_ccs', 'thorlabs_pmd'],
+    packages=['thorlabs_ccs', 'thorlabs_pmd', 'thorlabs_usb'],
     license='LGPL2.1',
     description='Control Thorlabs devices',
     long_description=open('README.md').read(),
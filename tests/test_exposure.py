@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+import numpy as np
+
+from thorlabs_ccs.exposure import AutoExposure, frame_peak_fraction
+from thorlabs_ccs.tlccs import (
+    TLCCS_NUM_RAW_PIXELS, SCAN_PIXELS_OFFSET, MAX_ADC_VALUE,
+    quantize_integration_time
+)
+
+DARK_LEVEL = 1000
+
+class LaggedCCS:
+    '''continuous scan where each frame was integrated with the time programmed when the previous one was read'''
+
+    continuous = True
+
+    def __init__(self, signal: float, int_time: float):
+        self.signal = signal # ADC counts per second at the peak
+        self.data = SimpleNamespace(int_time=quantize_integration_time(int_time))
+        self._in_flight = self.data.int_time
+        self.changes = 0
+
+    def set_integration_time(self, integration_time: float):
+        self.data.int_time = quantize_integration_time(integration_time)
+        self.changes += 1
+
+    def frame(self) -> np.ndarray:
+        int_time, self._in_flight = self._in_flight, self.data.int_time
+        raw = np.full((TLCCS_NUM_RAW_PIXELS,), DARK_LEVEL, dtype='<u2')
+        raw[SCAN_PIXELS_OFFSET + 1000] = min(DARK_LEVEL + self.signal * int_time, MAX_ADC_VALUE)
+        return raw
+
+def run(ccs: LaggedCCS, auto: AutoExposure, num_frames: int):
+    peaks = []
+    for _ in range(num_frames):
+        raw = ccs.frame()
+        peaks.append(frame_peak_fraction(raw)[0])
+        auto.update(raw)
+    return peaks
+
+def test_continuous_frames_integrated_at_previous_time():
+
+    ccs = LaggedCCS(signal=2e5, int_time=0.01)
+    auto = AutoExposure(ccs)
+    peaks = run(ccs, auto, 12)
+
+    assert all(auto.within_tolerance(p) for p in peaks[-4:])
+    # one correction, plus at most one refinement once the new time is seen
+    assert ccs.changes <= 2
+
+def test_continuous_recovers_from_saturation():
+
+    ccs = LaggedCCS(signal=5e6, int_time=0.1)
+    auto = AutoExposure(ccs)
+    peaks = run(ccs, auto, 20)
+
+    assert all(auto.within_tolerance(p) for p in peaks[-4:])
+    assert ccs.changes <= 5
@@ -0,0 +1,28 @@
+import numpy as np
+
+from thorlabs_ccs.tlccs import (
+    TLCCS_MIN_INT_TIME, TLCCS_MAX_INT_TIME,
+    decode_integration_time, encode_integration_time, quantize_integration_time
+)
+
+INT_TIMES = np.concatenate((
+    np.geomspace(TLCCS_MIN_INT_TIME, TLCCS_MAX_INT_TIME, 20000),
+    np.arange(TLCCS_MIN_INT_TIME, 0.01, 1e-6),
+))
+
+def test_quantize_integration_time_is_idempotent():
+
+    for t in INT_TIMES:
+        quantized = quantize_integration_time(t)
+        assert quantize_integration_time(quantized) == quantized, t
+
+def test_quantized_time_is_applied_by_the_device():
+
+    for t in INT_TIMES:
+        quantized = quantize_integration_time(t)
+        assert decode_integration_time(encode_integration_time(quantized)) == quantized, t
+
+def test_quantize_integration_time_example():
+    # 978 us used to quantize to a time that quantized again to 976 us
+    quantized = quantize_integration_time(0.000978)
+    assert quantize_integration_time(quantized) == quantized
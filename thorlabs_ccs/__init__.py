@@ -1,2 +1,11 @@
 from .tlccs import *
+from .acquisition import *
+from .async_tlccs import *
+from .manager import *
+from .simulation import *
+from .recorder import *
+from .exposure import *
+from .resampling import *
+from .pipeline import *
+from .peaks import *
 from .get_firmware import extract_ccs_firmware
\ No newline at end of file
@@ -0,0 +1,551 @@
+import array
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, List, NamedTuple, Optional, Tuple
+import numpy as np
+
+from .tlccs import (
+    TLCCS, TLCCS_NUM_PIXELS, TLCCS_NUM_RAW_PIXELS, CORRECTION_MODE_FACTORY,
+    CorrectionPlan, Overexposure,
+    allocate_raw_buffer, decode_scan_data, get_raw_scan_data, get_scan_data_corrected
+)
+
+DEFAULT_RING_FRAMES = 64
+DEFAULT_TRIGGER_QUEUE_SIZE = 1024
+DEFAULT_PIPELINE_BUFFERS = 3
+PIPELINE_STOP_CHECK_INTERVAL = 0.1 # s
+
+class AcquisitionStopped(Exception): ...
+
+class SpectrumFrame(NamedTuple):
+    index: int
+    timestamp: float
+    spectrum: np.ndarray
+
+class SpectrumBatch(NamedTuple):
+    indices: np.ndarray
+    timestamps: np.ndarray
+    spectra: np.ndarray
+
+class AcquisitionStats(NamedTuple):
+    frames_acquired: int
+    frames_read: int
+    frames_overrun: int
+    frames_overexposed: int
+
+class TriggeredFrame(NamedTuple):
+    sequence: int # number of the trigger, counting overexposed and dropped frames
+    timestamp: float # host time at which the frame was received
+    spectrum: np.ndarray
+
+class TriggerStats(NamedTuple):
+    frames_received: int
+    frames_dropped: int # discarded because the queue was full
+    frames_overexposed: int
+
+class PipelineStats(NamedTuple):
+    frames_transferred: int
+    frames_read: int
+    frames_overexposed: int
+    transfer_stalls: int # transfers delayed because every buffer was waiting to be decoded
+
+class ContinuousAcquisition:
+    '''
+    Reads frames from a spectrometer in continuous mode on a dedicated thread
+    and stores them in a preallocated ring of spectra holding the last num_frames
+    frames, plus one slot that the next frame is decoded into.
+    Frames that are overwritten before get_next/get_batch consumed them are
+    counted as overruns.
+    By default frames are factory corrected straight into the ring, without
+    per-frame allocations, and stop does not wait for a pending exposure to end.
+    A custom read_frame returns a spectrum that is copied in.
+    '''
+
+    def __init__(
+            self,
+            tlccs: TLCCS,
+            num_frames: int = DEFAULT_RING_FRAMES,
+            read_frame: Optional[Callable[[], np.ndarray]] = None,
+            dtype: np.dtype = np.float64
+        ):
+
+        if num_frames < 1:
+            raise ValueError('num_frames must be at least 1')
+
+        self.tlccs = tlccs
+        self.num_frames = num_frames
+        self.read_frame = read_frame
+
+        # the extra slot is never visible to consumers, so it can be written without the lock
+        self._num_slots = num_frames + 1
+        self.frames = np.zeros((self._num_slots, TLCCS_NUM_PIXELS), dtype=dtype)
+        self.timestamps = np.zeros((self._num_slots,), dtype=np.float64)
+        self._raw = allocate_raw_buffer()
+        self._plan: Optional[CorrectionPlan] = None
+
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+
+        self._write_count = 0
+        self._read_count = 0
+        self._frames_overrun = 0
+        self._frames_overexposed = 0
+
+    def start(self) -> None:
+
+        if self._thread is not None:
+            raise RuntimeError('acquisition already started')
+
+        self._stop_event.clear()
+        self._error = None
+        # resolved once, not for every frame
+        self._plan = self.tlccs.get_correction_plan(CORRECTION_MODE_FACTORY)
+        self.tlccs.start_continuous_scan()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self.tlccs.reset()
+
+        with self._cond:
+            self._cond.notify_all()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+
+        try:
+            while self._wait_for_frame():
+
+                slot = self._write_count % self._num_slots
+                try:
+                    self._read_into(self.frames[slot])
+                except Overexposure:
+                    with self._cond:
+                        self._frames_overexposed += 1
+                    continue
+
+                timestamp = time.time()
+
+                with self._cond:
+                    # the oldest frame drops out of the ring, it may still be unread
+                    if self._write_count - self._read_count >= self.num_frames:
+                        self._read_count += 1
+                        self._frames_overrun += 1
+
+                    self.timestamps[slot] = timestamp
+                    self._write_count += 1
+                    self._cond.notify_all()
+
+        except Exception as e:
+            with self._cond:
+                self._error = e
+                self._cond.notify_all()
+
+    def _wait_for_frame(self) -> bool:
+        # a custom read_frame waits for its frame itself
+        if self.read_frame is None:
+            return self.tlccs.wait_for_scan(stop_event=self._stop_event) is not None
+        return not self._stop_event.is_set()
+
+    def _read_into(self, out: np.ndarray) -> None:
+
+        if self.read_frame is None:
+            get_scan_data_corrected(self.tlccs.dev, self.tlccs.data, self._plan, raw=self._raw, out=out, dtype=out.dtype)
+        else:
+            out[:] = self.read_frame()
+
+    def _wait_for(self, predicate: Callable[[], bool], timeout: Optional[float]) -> None:
+        # must be called with self._cond held
+
+        if not self._cond.wait_for(lambda: predicate() or self._error is not None or not self.running, timeout):
+            raise TimeoutError
+
+        if predicate():
+            return
+
+        if self._error is not None:
+            raise AcquisitionStopped from self._error
+
+        raise AcquisitionStopped
+
+    def _frame(self, index: int) -> SpectrumFrame:
+        slot = index % self._num_slots
+        return SpectrumFrame(index, float(self.timestamps[slot]), self.frames[slot].copy())
+
+    def get_latest(self, timeout: Optional[float] = None) -> SpectrumFrame:
+        '''most recent frame, waiting for the first one if necessary. Does not consume frames'''
+
+        with self._cond:
+            self._wait_for(lambda: self._write_count > 0, timeout)
+            return self._frame(self._write_count - 1)
+
+    def get_next(self, timeout: Optional[float] = None) -> SpectrumFrame:
+        '''oldest unread frame, blocks until one is available'''
+
+        with self._cond:
+            self._wait_for(lambda: self._write_count > self._read_count, timeout)
+            frame = self._frame(self._read_count)
+            self._read_count += 1
+            return frame
+
+    def get_batch(self, num_frames: int, timeout: Optional[float] = None) -> SpectrumBatch:
+        '''next num_frames unread frames, blocks until they are all available'''
+
+        if not (1 <= num_frames <= self.num_frames):
+            raise ValueError(f'num_frames must be between 1 and {self.num_frames}')
+
+        with self._cond:
+            self._wait_for(lambda: self._write_count - self._read_count >= num_frames, timeout)
+            indices = np.arange(self._read_count, self._read_count + num_frames)
+            slots = indices % self._num_slots
+            batch = SpectrumBatch(indices, self.timestamps[slots], self.frames[slots])
+            self._read_count += num_frames
+            return batch
+
+    def stats(self) -> AcquisitionStats:
+
+        with self._cond:
+            return AcquisitionStats(
+                frames_acquired = self._write_count,
+                frames_read = self._read_count - self._frames_overrun,
+                frames_overrun = self._frames_overrun,
+                frames_overexposed = self._frames_overexposed
+            )
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+class TriggeredCapture:
+    '''
+    Arms the external trigger of a spectrometer and queues every triggered frame,
+    with its sequence number and host receive timestamp, from a dedicated thread.
+    There is no scan timeout: the thread waits for triggers until stopped.
+    In single shot mode the trigger is re-armed after every frame; continuous mode
+    re-arms in hardware and can follow faster trigger rates.
+    When the queue is full, the oldest frame is dropped.
+    read_frame reads the scan once it is ready for transfer (without waiting
+    for it), by default a factory corrected spectrum.
+    '''
+
+    def __init__(
+            self,
+            tlccs: TLCCS,
+            continuous: bool = True,
+            max_queue_size: int = DEFAULT_TRIGGER_QUEUE_SIZE,
+            read_frame: Optional[Callable[[TLCCS], np.ndarray]] = None
+        ):
+
+        self.tlccs = tlccs
+        self.continuous = continuous
+        self.read_frame = read_frame if read_frame is not None else self._read_factory
+
+        self._queue: Deque[TriggeredFrame] = deque(maxlen=max_queue_size)
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+
+        self._sequence = 0
+        self._frames_dropped = 0
+        self._frames_overexposed = 0
+
+    @staticmethod
+    def _read_factory(tlccs: TLCCS) -> np.ndarray:
+        plan = tlccs.get_correction_plan(CORRECTION_MODE_FACTORY)
+        return get_scan_data_corrected(tlccs.dev, tlccs.data, plan)
+
+    def _arm(self) -> None:
+        if self.continuous:
+            self.tlccs.start_continuous_scan_ext_trigger()
+        else:
+            self.tlccs.start_single_scan_ext_trigger()
+
+    def start(self) -> None:
+
+        if self._thread is not None:
+            raise RuntimeError('capture already started')
+
+        self._stop_event.clear()
+        self._error = None
+        self._arm()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self.tlccs.reset()
+
+        with self._cond:
+            self._cond.notify_all()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+
+        try:
+            while self.tlccs.wait_for_scan(stop_event=self._stop_event) is not None:
+
+                sequence = self._sequence
+                self._sequence += 1
+                try:
+                    spectrum = self.read_frame(self.tlccs)
+                except Overexposure:
+                    with self._cond:
+                        self._frames_overexposed += 1
+                    spectrum = None
+
+                timestamp = time.time()
+                if not self.continuous:
+                    self._arm()
+
+                if spectrum is None:
+                    continue
+
+                with self._cond:
+                    if len(self._queue) == self._queue.maxlen:
+                        self._frames_dropped += 1
+                    self._queue.append(TriggeredFrame(sequence, timestamp, spectrum))
+                    self._cond.notify_all()
+
+        except Exception as e:
+            with self._cond:
+                self._error = e
+                self._cond.notify_all()
+
+    def get(self, timeout: Optional[float] = None) -> TriggeredFrame:
+        '''oldest queued frame, blocks until a trigger arrives'''
+
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: self._queue or self._error is not None or not self.running,
+                timeout
+            )
+            if not ready:
+                raise TimeoutError
+            if self._queue:
+                return self._queue.popleft()
+            if self._error is not None:
+                raise AcquisitionStopped from self._error
+            raise AcquisitionStopped
+
+    def get_all(self) -> List[TriggeredFrame]:
+        '''every queued frame, without waiting'''
+
+        with self._cond:
+            frames = list(self._queue)
+            self._queue.clear()
+            return frames
+
+    def stats(self) -> TriggerStats:
+
+        with self._cond:
+            return TriggerStats(
+                frames_received = self._sequence,
+                frames_dropped = self._frames_dropped,
+                frames_overexposed = self._frames_overexposed
+            )
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+class PipelinedReader:
+    '''
+    Continuous mode reader that overlaps the USB transfer of the next frames with the
+    decoding of the previous one. A helper thread waits for every scan and reads it into
+    one of num_buffers rotating raw buffers, while read decodes and corrects the frames
+    already transferred. pyusb transfers are synchronous but release the GIL, so the
+    transfer runs while the caller processes the previous frame.
+    When the caller falls behind, the helper thread stalls once every buffer holds a
+    frame waiting to be decoded.
+    '''
+
+    def __init__(
+            self,
+            tlccs: TLCCS,
+            num_buffers: int = DEFAULT_PIPELINE_BUFFERS,
+            plan: Optional[CorrectionPlan] = None
+        ):
+
+        if num_buffers < 2:
+            raise ValueError('num_buffers must be at least 2')
+
+        self.tlccs = tlccs
+        self.plan = plan
+        self.num_buffers = num_buffers
+        self._buffers = [allocate_raw_buffer() for _ in range(num_buffers)]
+
+        # raw buffers cycle from _free (transfer) to _ready (decode) and back
+        self._free: queue.Queue = queue.Queue()
+        self._ready: queue.Queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+
+        self._frames_transferred = 0
+        self._frames_read = 0
+        self._frames_overexposed = 0
+        self._transfer_stalls = 0
+
+    def start(self) -> None:
+
+        if self._thread is not None:
+            raise RuntimeError('reader already started')
+
+        self._free = queue.Queue()
+        self._ready = queue.Queue()
+        for raw in self._buffers:
+            self._free.put(raw)
+
+        self._stop_event.clear()
+        self._error = None
+        self.tlccs.start_continuous_scan()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self.tlccs.reset()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _next_free(self) -> Optional[array.array]:
+
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            self._transfer_stalls += 1
+
+        while not self._stop_event.is_set():
+            try:
+                return self._free.get(timeout=PIPELINE_STOP_CHECK_INTERVAL)
+            except queue.Empty:
+                pass
+        return None
+
+    def _run(self) -> None:
+
+        try:
+            while True:
+                raw = self._next_free()
+                if raw is None or self.tlccs.wait_for_scan(stop_event=self._stop_event) is None:
+                    break
+                get_raw_scan_data(self.tlccs.dev, raw)
+                self._frames_transferred += 1
+                self._ready.put((raw, time.time()))
+
+        except Exception as e:
+            self._error = e
+
+        finally:
+            # wakes up readers: no more frames
+            self._ready.put(None)
+
+    def _next_ready(self, timeout: Optional[float]) -> Tuple[array.array, float]:
+
+        try:
+            item = self._ready.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError from None
+
+        if item is None:
+            self._ready.put(None) # for the next reader
+            if self._error is not None:
+                raise AcquisitionStopped from self._error
+            raise AcquisitionStopped
+        return item
+
+    def read_raw(self, out: Optional[np.ndarray] = None, timeout: Optional[float] = None) -> SpectrumFrame:
+        '''next raw frame (TLCCS_NUM_RAW_PIXELS ADC words), copied into out if given'''
+
+        raw, timestamp = self._next_ready(timeout)
+        try:
+            if out is None:
+                out = np.empty((TLCCS_NUM_RAW_PIXELS,), dtype=np.uint16)
+            out[:] = np.frombuffer(raw, dtype='<u2', count=TLCCS_NUM_RAW_PIXELS)
+        finally:
+            self._free.put(raw)
+
+        index = self._frames_read
+        self._frames_read += 1
+        return SpectrumFrame(index, timestamp, out)
+
+    def read(
+            self,
+            out: Optional[np.ndarray] = None,
+            dtype: np.dtype = np.float64,
+            timeout: Optional[float] = None
+        ) -> SpectrumFrame:
+        '''
+        next frame, decoded and corrected (factory correction unless a plan was given)
+        into out if given. Overexposed frames raise Overexposure.
+        '''
+
+        raw, timestamp = self._next_ready(timeout)
+        try:
+            spectrum = decode_scan_data(raw, out, dtype)
+        except Overexposure:
+            self._frames_overexposed += 1
+            raise
+        finally:
+            # the buffer can be refilled as soon as it is decoded
+            self._free.put(raw)
+
+        plan = self.plan if self.plan is not None else self.tlccs.get_correction_plan(CORRECTION_MODE_FACTORY)
+        spectrum *= plan.gain_for(spectrum.dtype)
+
+        index = self._frames_read
+        self._frames_read += 1
+        return SpectrumFrame(index, timestamp, spectrum)
+
+    def stats(self) -> PipelineStats:
+        return PipelineStats(
+            frames_transferred = self._frames_transferred,
+            frames_read = self._frames_read,
+            frames_overexposed = self._frames_overexposed,
+            transfer_stalls = self._transfer_stalls
+        )
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
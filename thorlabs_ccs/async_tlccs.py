@@ -0,0 +1,151 @@
+import array
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple, Union
+import numpy as np
+
+from .tlccs import (
+    TLCCS, DevInfo,
+    CORRECTION_MODE_FACTORY, CORRECTION_MODE_RANGE, CORRECTION_MODE_NOISE,
+    get_raw_scan_data, get_scan_data_corrected, scan_transfer_ready
+)
+
+class AsyncTLCCS:
+    '''
+    asyncio front-end for TLCCS. USB I/O runs on a single worker thread per device,
+    so that one event loop can drive several spectrometers. Waiting for a scan only
+    sleeps on the event loop between status polls and can be cancelled at any time.
+    '''
+
+    def __init__(self, tlccs: TLCCS):
+        self.tlccs = tlccs
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tlccs')
+
+    @classmethod
+    async def open(cls, device_info: DevInfo, **kwargs) -> 'AsyncTLCCS':
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tlccs')
+        try:
+            loop = asyncio.get_running_loop()
+            tlccs = await loop.run_in_executor(executor, functools.partial(TLCCS, device_info, **kwargs))
+        finally:
+            executor.shutdown(wait=False)
+        return cls(tlccs)
+
+    async def _run(self, fn: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def start_single_scan(self) -> None:
+        await self._run(self.tlccs.start_single_scan)
+
+    async def start_continuous_scan(self) -> None:
+        await self._run(self.tlccs.start_continuous_scan)
+
+    async def start_single_scan_ext_trigger(self) -> None:
+        await self._run(self.tlccs.start_single_scan_ext_trigger)
+
+    async def start_continuous_scan_ext_trigger(self) -> None:
+        await self._run(self.tlccs.start_continuous_scan_ext_trigger)
+
+    async def set_integration_time(self, integration_time: float) -> None:
+        await self._run(self.tlccs.set_integration_time, integration_time)
+
+    async def get_integration_time(self) -> float:
+        return await self._run(self.tlccs.get_integration_time)
+
+    async def reset(self) -> None:
+        await self._run(self.tlccs.reset)
+
+    async def wait_for_scan(self, timeout: Optional[float] = None) -> int:
+        '''
+        wait until the current scan is ready for transfer, returns the number of status polls.
+        Same schedule as TLCCS.wait_for_scan, sleeping on the event loop.
+        '''
+
+        polls = 0
+        for delay in self.tlccs.scan_wait_schedule(timeout):
+            if delay > 0:
+                await asyncio.sleep(delay)
+            polls += 1
+            if await self._run(scan_transfer_ready, self.tlccs.dev):
+                break
+
+        self.tlccs.mark_scan_transferred(polls)
+        return polls
+
+    async def get_raw_scan_data(self, raw: Optional[array.array] = None) -> np.ndarray:
+        await self.wait_for_scan()
+        return await self._run(get_raw_scan_data, self.tlccs.dev, raw)
+
+    async def get_scan_data_factory(
+            self,
+            as_ndarray: bool = True,
+            raw: Optional[array.array] = None,
+            out: Optional[np.ndarray] = None,
+            dtype: np.dtype = np.float64
+        ) -> Union[np.ndarray, array.array]:
+
+        plan = self.tlccs.get_correction_plan(CORRECTION_MODE_FACTORY)
+        await self.wait_for_scan()
+        return await self._run(get_scan_data_corrected, self.tlccs.dev, self.tlccs.data, plan, as_ndarray, raw, out, dtype)
+
+    async def get_scan_data_corrected_range(
+            self,
+            min_wl: float = 321.45,
+            max_wl: float = 742.11,
+            as_ndarray: bool = True,
+            raw: Optional[array.array] = None,
+            out: Optional[np.ndarray] = None,
+            dtype: np.dtype = np.float64
+        ) -> Tuple[Union[np.ndarray, array.array], float]:
+
+        plan = self.tlccs.get_correction_plan(CORRECTION_MODE_RANGE, min_wl, max_wl)
+        await self.wait_for_scan()
+        scan_data = await self._run(get_scan_data_corrected, self.tlccs.dev, self.tlccs.data, plan, as_ndarray, raw, out, dtype)
+        return scan_data, plan.noise_amplification_dB
+
+    async def get_scan_data_corrected_noise(
+            self,
+            center_wl: float = 531.78,
+            noise_amplification_dB: float = 1.0,
+            as_ndarray: bool = True,
+            raw: Optional[array.array] = None,
+            out: Optional[np.ndarray] = None,
+            dtype: np.dtype = np.float64
+        ) -> Tuple[Union[np.ndarray, array.array], float, float]:
+
+        plan = self.tlccs.get_correction_plan(CORRECTION_MODE_NOISE, center_wl, noise_amplification_dB)
+        await self.wait_for_scan()
+        scan_data = await self._run(get_scan_data_corrected, self.tlccs.dev, self.tlccs.data, plan, as_ndarray, raw, out, dtype)
+        return scan_data, plan.wavelength_left, plan.wavelength_right
+
+    async def continuous_frames(
+            self,
+            read_frame: Optional[Callable[[], Awaitable]] = None
+        ) -> AsyncIterator:
+        '''
+        Start continuous mode and yield frames (factory corrected by default) until the
+        consumer stops iterating or is cancelled, then reset the device.
+        '''
+
+        if read_frame is None:
+            read_frame = self.get_scan_data_factory
+
+        await self.start_continuous_scan()
+        try:
+            while True:
+                yield await read_frame()
+        finally:
+            await self.reset()
+
+    async def close(self) -> None:
+        await self._run(self.tlccs.close)
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
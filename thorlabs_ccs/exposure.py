@@ -0,0 +1,144 @@
+from typing import NamedTuple, Optional, Tuple
+import numpy as np
+
+from .tlccs import (
+    TLCCS, TLCCS_NUM_PIXELS, TLCCS_NUM_RAW_PIXELS, TLCCS_MIN_INT_TIME, TLCCS_MAX_INT_TIME,
+    CORRECTION_MODE_FACTORY, MAX_ADC_VALUE, DARK_LEVEL_THRESHOLD_ADC,
+    DARK_PIXELS_OFFSET, NO_DARK_PIXELS, SCAN_PIXELS_OFFSET,
+    allocate_raw_buffer, decode_scan_data, encode_integration_time, quantize_integration_time
+)
+
+DEFAULT_TARGET_PEAK = 0.7 # fraction of the ADC range above the dark level
+DEFAULT_TOLERANCE = 0.1 # relative to the target
+DEFAULT_MAX_STEP = 100.0 # largest increase of integration time in one scan
+DEFAULT_SATURATION_STEP = 10.0 # decrease of integration time after a saturated frame
+MIN_PEAK_FRACTION = 0.005 # below this the peak is mostly read noise
+SATURATION_LEVEL = 0.98 * MAX_ADC_VALUE
+
+class ExposureResult(NamedTuple):
+    int_time: float
+    peak_fraction: float
+    scans: int
+    converged: bool
+
+def frame_peak_fraction(raw_scan_data: np.ndarray) -> Tuple[float, bool]:
+    '''
+    Peak of a raw frame as a fraction of the ADC range left above the dark level,
+    and whether the frame is saturated (in which case the fraction is a lower bound)
+    '''
+
+    raw_scan_data = np.frombuffer(raw_scan_data, dtype='<u2', count=TLCCS_NUM_RAW_PIXELS)
+    dark_com = float(raw_scan_data[DARK_PIXELS_OFFSET:DARK_PIXELS_OFFSET+NO_DARK_PIXELS].mean())
+    if dark_com > DARK_LEVEL_THRESHOLD_ADC:
+        return 1.0, True
+
+    peak = int(raw_scan_data[SCAN_PIXELS_OFFSET:SCAN_PIXELS_OFFSET+TLCCS_NUM_PIXELS].max())
+    fraction = (peak - dark_com) / (MAX_ADC_VALUE - dark_com)
+    return max(fraction, 0.0), peak >= SATURATION_LEVEL
+
+class AutoExposure:
+    '''
+    Integration time controller. The signal above the dark level is proportional to
+    the integration time, so one well exposed frame is enough to jump to the target peak
+    fraction. Saturated frames only give a lower bound and divide the integration time by
+    saturation_step, frames at the noise level multiply it by max_step. Every candidate is clamped to
+    [min_int_time, max_int_time] and quantized like the device does, and the device is
+    only reprogrammed when the quantized time changes.
+    In continuous mode the frame read after a change was already integrating, so it is
+    scaled against the previous integration time.
+    '''
+
+    def __init__(
+            self,
+            tlccs: TLCCS,
+            target: float = DEFAULT_TARGET_PEAK,
+            tolerance: float = DEFAULT_TOLERANCE,
+            min_int_time: float = TLCCS_MIN_INT_TIME,
+            max_int_time: float = TLCCS_MAX_INT_TIME,
+            max_step: float = DEFAULT_MAX_STEP,
+            saturation_step: float = DEFAULT_SATURATION_STEP
+        ):
+
+        if not 0 < target < 1:
+            raise ValueError('target must be between 0 and 1')
+        if max_step <= 1 or saturation_step <= 1:
+            raise ValueError('max_step and saturation_step must be larger than 1')
+
+        self.tlccs = tlccs
+        self.target = target
+        self.tolerance = tolerance
+        self.min_int_time = max(min_int_time, TLCCS_MIN_INT_TIME)
+        self.max_int_time = min(max_int_time, TLCCS_MAX_INT_TIME)
+        self.max_step = max_step
+        self.saturation_step = saturation_step
+
+        self.last_peak_fraction: Optional[float] = None
+        # integration time of the next frame, when it differs from the one programmed
+        self._frame_int_time: Optional[float] = None
+        self._raw = allocate_raw_buffer()
+
+    def within_tolerance(self, peak_fraction: float, saturated: bool = False) -> bool:
+        return not saturated and abs(peak_fraction - self.target) <= self.tolerance * self.target
+
+    def next_integration_time(self, int_time: float, peak_fraction: float, saturated: bool) -> float:
+        '''integration time expected to bring the peak to the target, quantized'''
+
+        if saturated:
+            scale = 1 / self.saturation_step
+        elif peak_fraction < MIN_PEAK_FRACTION:
+            scale = self.max_step
+        else:
+            scale = min(self.target / peak_fraction, self.max_step)
+
+        candidate = min(max(int_time * scale, self.min_int_time), self.max_int_time)
+        return quantize_integration_time(candidate)
+
+    def update(self, raw_scan_data: np.ndarray) -> bool:
+        '''adjust the integration time after a frame, returns True if it was changed'''
+
+        programmed = self.tlccs.data.int_time
+        int_time = self._frame_int_time if self._frame_int_time is not None else programmed
+        self._frame_int_time = None
+
+        peak_fraction, saturated = frame_peak_fraction(raw_scan_data)
+        self.last_peak_fraction = peak_fraction
+        if self.within_tolerance(peak_fraction, saturated):
+            return False
+
+        next_int_time = self.next_integration_time(int_time, peak_fraction, saturated)
+        # same device setting, even if the times differ by a rounding error
+        if encode_integration_time(next_int_time) == encode_integration_time(programmed):
+            return False
+
+        if self.tlccs.continuous:
+            self._frame_int_time = programmed
+        self.tlccs.set_integration_time(next_int_time)
+        return True
+
+    def converge(self, max_scans: int = 10) -> ExposureResult:
+        '''take single scans until the peak is within tolerance of the target'''
+
+        for scans in range(1, max_scans+1):
+            self.tlccs.start_single_scan()
+            raw_scan_data = self.tlccs.get_raw_scan_data(self._raw)
+            int_time = self.tlccs.data.int_time
+            if not self.update(raw_scan_data):
+                peak_fraction, saturated = frame_peak_fraction(raw_scan_data)
+                return ExposureResult(int_time, peak_fraction, scans, self.within_tolerance(peak_fraction, saturated))
+
+        return ExposureResult(self.tlccs.data.int_time, self.last_peak_fraction, max_scans, False)
+
+    def read_frame(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        '''
+        Read the next frame of a running scan, adjust the integration time for the
+        following ones and return the factory corrected spectrum. Overexposed frames
+        still raise Overexposure, after the integration time was lowered.
+        Can be used as read_frame of ContinuousAcquisition.
+        '''
+
+        raw_scan_data = self.tlccs.get_raw_scan_data(self._raw)
+        self.update(raw_scan_data)
+
+        spectrum = decode_scan_data(raw_scan_data, out)
+        spectrum *= self.tlccs.get_correction_plan(CORRECTION_MODE_FACTORY).gain_for(spectrum.dtype)
+        return spectrum
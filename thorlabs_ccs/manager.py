@@ -0,0 +1,147 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, List, NamedTuple, Optional
+import numpy as np
+
+from .tlccs import TLCCS, DevInfo, DeviceNotFound, list_spectrometers
+
+class SynchronizedBatch(NamedTuple):
+    serial_numbers: List[str]
+    start_timestamps: np.ndarray # host time at which each scan was started
+    timestamps: np.ndarray # host time at which each frame was received
+    spectra: np.ndarray # (num_devices, TLCCS_NUM_PIXELS)
+
+    @property
+    def start_skew(self) -> float:
+        return float(self.start_timestamps.max() - self.start_timestamps.min())
+
+class SpectrometerOpenError(Exception):
+
+    def __init__(self, errors: Dict[str, BaseException]):
+        self.errors = errors
+        details = ', '.join(f'{serial}: {e!r}' for serial, e in errors.items())
+        super().__init__(f'could not open {len(errors)} spectrometer(s): {details}')
+
+class SpectrometerManager:
+    '''
+    Opens several CCS spectrometers concurrently and captures synchronized scans.
+    Every device gets a dedicated worker thread; scans are started on all
+    workers at once, released by a barrier, so that startup time and
+    inter-device skew scale with the slowest device rather than the number of devices.
+    '''
+
+    def __init__(
+            self,
+            devices: Optional[List[DevInfo]] = None,
+            **tlccs_kwargs
+        ):
+
+        if devices is None:
+            devices = list_spectrometers()
+        if not devices:
+            raise DeviceNotFound
+
+        self.devices = sorted(devices, key=lambda d: d.serial_number)
+        self.serial_numbers = [d.serial_number for d in self.devices]
+        self._executors = {
+            serial: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'tlccs-{serial}')
+            for serial in self.serial_numbers
+        }
+
+        futures = {
+            d.serial_number: self._executors[d.serial_number].submit(TLCCS, d, **tlccs_kwargs)
+            for d in self.devices
+        }
+
+        self.spectrometers: Dict[str, TLCCS] = {}
+        errors: Dict[str, BaseException] = {}
+        for serial, future in futures.items():
+            try:
+                self.spectrometers[serial] = future.result()
+            except Exception as e:
+                errors[serial] = e
+
+        if errors:
+            self.close()
+            raise SpectrometerOpenError(errors)
+
+    def _run_all(self, fn: Callable[[TLCCS], object]) -> Dict[str, object]:
+
+        futures: Dict[str, Future] = {
+            serial: self._executors[serial].submit(fn, tlccs)
+            for serial, tlccs in self.spectrometers.items()
+        }
+        return {serial: future.result() for serial, future in futures.items()}
+
+    def set_integration_time(self, integration_time: float) -> None:
+        self._run_all(lambda tlccs: tlccs.set_integration_time(integration_time))
+
+    def start_continuous_scan(self) -> Dict[str, float]:
+        '''arm continuous mode on every device at once, returns the start timestamps'''
+
+        barrier = threading.Barrier(len(self.spectrometers))
+
+        def start(tlccs: TLCCS) -> float:
+            barrier.wait()
+            timestamp = time.time()
+            tlccs.start_continuous_scan()
+            return timestamp
+
+        return self._run_all(start)
+
+    def capture(
+            self,
+            read_frame: Optional[Callable[[TLCCS], np.ndarray]] = None,
+            continuous: bool = False
+        ) -> SynchronizedBatch:
+        '''
+        Start a single scan on every device at once (or, if continuous, read the next
+        frame of an already running continuous scan) and collect one frame per device.
+        '''
+
+        if read_frame is None:
+            read_frame = TLCCS.get_scan_data_factory
+
+        barrier = threading.Barrier(len(self.spectrometers))
+
+        def capture_one(tlccs: TLCCS):
+            barrier.wait()
+            start_timestamp = time.time()
+            if not continuous:
+                tlccs.start_single_scan()
+            spectrum = read_frame(tlccs)
+            return start_timestamp, time.time(), spectrum
+
+        results = self._run_all(capture_one)
+        start_timestamps, timestamps, spectra = zip(*(results[serial] for serial in self.serial_numbers))
+        return SynchronizedBatch(
+            serial_numbers = list(self.serial_numbers),
+            start_timestamps = np.array(start_timestamps),
+            timestamps = np.array(timestamps),
+            spectra = np.stack(spectra)
+        )
+
+    def reset(self) -> None:
+        self._run_all(lambda tlccs: tlccs.reset())
+
+    def close(self) -> None:
+
+        if self.spectrometers:
+            self._run_all(lambda tlccs: tlccs.close())
+            self.spectrometers = {}
+
+        for executor in self._executors.values():
+            executor.shutdown(wait=True)
+
+    def __getitem__(self, serial_number: str) -> TLCCS:
+        return self.spectrometers[serial_number]
+
+    def __len__(self) -> int:
+        return len(self.spectrometers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
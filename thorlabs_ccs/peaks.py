@@ -0,0 +1,256 @@
+from typing import NamedTuple, Optional, Tuple
+import numpy as np
+
+from .tlccs import (
+    TLCCS, TLCCS_WL_CAL, TLCCS_CAL_DATA_SET_FACTORY, TLCCS_CAL_DATA_SET_USER,
+    InvalidUserData
+)
+
+PEAK_PARABOLIC = 0
+PEAK_GAUSSIAN = 1
+PEAK_CENTROID = 2
+
+DEFAULT_PEAK_THRESHOLD = 0.1
+DEFAULT_CENTROID_HALF_WIDTH = 3 # pixels on each side of the maximum
+DEFAULT_MAX_HALF_WIDTH = 64 # pixels searched on each side for the half maximum
+
+class PeakTable(NamedTuple):
+    '''one entry per peak, sorted by frame then pixel'''
+    frame: np.ndarray # index of the spectrum in the batch
+    pixel: np.ndarray # pixel of the local maximum
+    position: np.ndarray # sub-pixel position
+    wavelength: np.ndarray # nm
+    height: np.ndarray
+    fwhm_pixels: np.ndarray # NaN if the half maximum is not reached within max_half_width
+    fwhm: np.ndarray # nm
+
+    def take(self, index: np.ndarray) -> 'PeakTable':
+        return PeakTable(*(field[index] for field in self))
+
+def _as_batch(spectra: np.ndarray) -> np.ndarray:
+    spectra = np.asarray(spectra)
+    if spectra.dtype.kind != 'f':
+        spectra = spectra.astype(np.float64)
+    return spectra.reshape((-1, spectra.shape[-1]))
+
+def find_peaks(
+        spectra: np.ndarray,
+        threshold: float = DEFAULT_PEAK_THRESHOLD,
+        relative_threshold: Optional[float] = None,
+        min_distance: int = 1
+    ) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    (frame, pixel) of the local maxima of a batch of spectra (..., num_pixels) above threshold,
+    or above relative_threshold times the maximum of their spectrum if given. A maximum must
+    also be the largest value within min_distance pixels. Plateaus count once, at their left end.
+    '''
+
+    spectra = _as_batch(spectra)
+    num_pixels = spectra.shape[-1]
+    center = spectra[:, 1:-1]
+
+    if relative_threshold is not None:
+        level = relative_threshold * spectra.max(axis=1, keepdims=True)
+    else:
+        level = threshold
+
+    is_peak = (center > spectra[:, :-2]) & (center >= spectra[:, 2:]) & (center >= level)
+
+    if min_distance > 1:
+        # sliding maximum, a loop over the window width only
+        padded = np.pad(spectra, ((0, 0), (min_distance, min_distance)), constant_values=-np.inf)
+        local_max = padded[:, :num_pixels].copy()
+        for shift in range(1, 2*min_distance + 1):
+            np.maximum(local_max, padded[:, shift:shift+num_pixels], out=local_max)
+        is_peak &= center >= local_max[:, 1:-1]
+
+    frame, pixel = np.nonzero(is_peak)
+    return frame, pixel + 1
+
+def refine_peaks(
+        spectra: np.ndarray,
+        frame: np.ndarray,
+        pixel: np.ndarray,
+        method: int = PEAK_PARABOLIC,
+        centroid_half_width: int = DEFAULT_CENTROID_HALF_WIDTH
+    ) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    sub-pixel position and height of the maxima at (frame, pixel), from a parabola or a
+    gaussian (a parabola on the log) through the three pixels around the maximum, or from
+    the centroid of the pixels above half maximum within centroid_half_width
+    '''
+
+    spectra = _as_batch(spectra)
+    y_left = spectra[frame, pixel - 1]
+    y_peak = spectra[frame, pixel]
+    y_right = spectra[frame, pixel + 1]
+
+    if method == PEAK_PARABOLIC:
+        return _vertex(pixel, y_left, y_peak, y_right)
+
+    if method == PEAK_GAUSSIAN:
+        position, height = _vertex(pixel, y_left, y_peak, y_right)
+        positive = (y_left > 0) & (y_peak > 0) & (y_right > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_position, log_height = _vertex(pixel, np.log(y_left), np.log(y_peak), np.log(y_right))
+        # not defined for non positive values, those keep the parabolic estimate
+        position = np.where(positive, log_position, position)
+        height = np.where(positive, np.exp(log_height), height)
+        return position, height
+
+    if method == PEAK_CENTROID:
+        offsets = np.arange(-centroid_half_width, centroid_half_width + 1)
+        index = pixel[:, np.newaxis] + offsets
+        inside = (index >= 0) & (index < spectra.shape[-1])
+        values = spectra[frame[:, np.newaxis], np.clip(index, 0, spectra.shape[-1] - 1)]
+        weights = np.where(inside, np.maximum(values - y_peak[:, np.newaxis] / 2, 0), 0)
+        position = (weights * index).sum(axis=1) / weights.sum(axis=1)
+        return position, y_peak
+
+    raise ValueError(f'unknown peak refinement method {method}')
+
+def _vertex(
+        pixel: np.ndarray,
+        y_left: np.ndarray,
+        y_peak: np.ndarray,
+        y_right: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+    '''vertex of the parabola through (pixel-1, y_left), (pixel, y_peak), (pixel+1, y_right)'''
+
+    curvature = y_left - 2*y_peak + y_right
+    slope = y_left - y_right
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = np.where(curvature != 0, 0.5 * slope / curvature, 0.0)
+    return pixel + delta, y_peak - 0.25 * slope * delta
+
+def half_maximum_crossings(
+        spectra: np.ndarray,
+        frame: np.ndarray,
+        pixel: np.ndarray,
+        height: np.ndarray,
+        max_half_width: int = DEFAULT_MAX_HALF_WIDTH
+    ) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    interpolated positions left and right of each peak where the spectrum falls below
+    half of height, NaN when not found within max_half_width pixels
+    '''
+
+    spectra = _as_batch(spectra)
+    num_pixels = spectra.shape[-1]
+    half = height[:, np.newaxis] / 2
+    steps = np.arange(1, max_half_width + 1)
+
+    crossings = []
+    for direction in (-1, 1):
+        index = pixel[:, np.newaxis] + direction * steps
+        inside = (index >= 0) & (index < num_pixels)
+        values = spectra[frame[:, np.newaxis], np.clip(index, 0, num_pixels - 1)]
+        below = inside & (values < half)
+
+        first = np.argmax(below, axis=1)
+        rows = np.arange(len(first))
+        found = below[rows, first]
+        y_below = values[rows, first]
+        # the sample before the first one below half maximum (the maximum itself for first == 0)
+        y_above = np.where(first > 0, values[rows, np.maximum(first - 1, 0)], spectra[frame, pixel])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction = (y_above - half[:, 0]) / (y_above - y_below)
+        crossing = pixel + direction * (first + fraction)
+        crossings.append(np.where(found, crossing, np.nan))
+
+    return crossings[0], crossings[1]
+
+def pixel_to_wavelength(poly: np.ndarray, position: np.ndarray) -> np.ndarray:
+    '''evaluate the calibration polynomial at (sub-)pixel positions'''
+    return poly[0] + position * (poly[1] + position * (poly[2] + position * poly[3]))
+
+def detect_peaks(
+        spectra: np.ndarray,
+        poly: np.ndarray,
+        threshold: float = DEFAULT_PEAK_THRESHOLD,
+        relative_threshold: Optional[float] = None,
+        min_distance: int = 1,
+        method: int = PEAK_PARABOLIC,
+        centroid_half_width: int = DEFAULT_CENTROID_HALF_WIDTH,
+        max_half_width: int = DEFAULT_MAX_HALF_WIDTH
+    ) -> PeakTable:
+    '''find, refine and calibrate the peaks of one spectrum or a batch of spectra'''
+
+    spectra = _as_batch(spectra)
+    poly = np.asarray(poly, dtype=np.float64)
+
+    frame, pixel = find_peaks(spectra, threshold, relative_threshold, min_distance)
+    position, height = refine_peaks(spectra, frame, pixel, method, centroid_half_width)
+    left, right = half_maximum_crossings(spectra, frame, pixel, height, max_half_width)
+
+    return PeakTable(
+        frame = frame,
+        pixel = pixel,
+        position = position,
+        wavelength = pixel_to_wavelength(poly, position),
+        height = height,
+        fwhm_pixels = right - left,
+        fwhm = np.abs(pixel_to_wavelength(poly, right) - pixel_to_wavelength(poly, left))
+    )
+
+def strongest_peaks(table: PeakTable) -> PeakTable:
+    '''highest peak of every frame that has one'''
+
+    order = np.lexsort((-table.height, table.frame))
+    _, first = np.unique(table.frame[order], return_index=True)
+    return table.take(order[first])
+
+class PeakDetector:
+    '''detect_peaks with fixed parameters and the calibration of a spectrometer'''
+
+    def __init__(
+            self,
+            poly: np.ndarray,
+            threshold: float = DEFAULT_PEAK_THRESHOLD,
+            relative_threshold: Optional[float] = None,
+            min_distance: int = 1,
+            method: int = PEAK_PARABOLIC,
+            centroid_half_width: int = DEFAULT_CENTROID_HALF_WIDTH,
+            max_half_width: int = DEFAULT_MAX_HALF_WIDTH
+        ):
+
+        if method not in (PEAK_PARABOLIC, PEAK_GAUSSIAN, PEAK_CENTROID):
+            raise ValueError(f'unknown peak refinement method {method}')
+
+        self.poly = np.array(poly, dtype=np.float64)
+        self.threshold = threshold
+        self.relative_threshold = relative_threshold
+        self.min_distance = min_distance
+        self.method = method
+        self.centroid_half_width = centroid_half_width
+        self.max_half_width = max_half_width
+
+    @classmethod
+    def from_calibration(cls, cal: TLCCS_WL_CAL, **kwargs) -> 'PeakDetector':
+        return cls(cal.poly, **kwargs)
+
+    @classmethod
+    def for_tlccs(
+            cls,
+            tlccs: TLCCS,
+            factory_or_user: int = TLCCS_CAL_DATA_SET_FACTORY,
+            **kwargs
+        ) -> 'PeakDetector':
+
+        if factory_or_user == TLCCS_CAL_DATA_SET_USER:
+            if not tlccs.data.user_wavelength_cal.valid:
+                raise InvalidUserData
+            return cls.from_calibration(tlccs.data.user_wavelength_cal, **kwargs)
+        return cls.from_calibration(tlccs.data.factory_wavelength_cal, **kwargs)
+
+    def __call__(self, spectra: np.ndarray) -> PeakTable:
+        return detect_peaks(
+            spectra,
+            self.poly,
+            threshold = self.threshold,
+            relative_threshold = self.relative_threshold,
+            min_distance = self.min_distance,
+            method = self.method,
+            centroid_half_width = self.centroid_half_width,
+            max_half_width = self.max_half_width
+        )
@@ -0,0 +1,259 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent import futures
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Deque, Iterator, NamedTuple, Optional, Tuple
+import numpy as np
+
+from .tlccs import (
+    TLCCS, TLCCS_NUM_PIXELS, Overexposure,
+    allocate_raw_buffer
+)
+
+class PipelineClosed(Exception): ...
+
+class PipelineResult(NamedTuple):
+    index: int
+    timestamp: float
+    result: Any
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        # python >= 3.13, the segment is owned by the pipeline, not by the workers
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+# state of a worker process, set once by the pool initializer
+_worker_shm: Optional[shared_memory.SharedMemory] = None
+_worker_frames: Optional[np.ndarray] = None
+_worker_analyze: Optional[Callable[[np.ndarray], Any]] = None
+
+def _init_worker(name: str, shape: Tuple[int, int], dtype: str, analyze: Callable[[np.ndarray], Any]) -> None:
+
+    global _worker_shm, _worker_frames, _worker_analyze
+    _worker_shm = _attach(name)
+    _worker_frames = np.ndarray(shape, dtype=dtype, buffer=_worker_shm.buf)
+    _worker_frames.flags.writeable = False
+    _worker_analyze = analyze
+
+def _analyze_slot(slot: int) -> Any:
+    return _worker_analyze(_worker_frames[slot])
+
+class FramePipeline:
+    '''
+    Hands frames to a pool of worker processes through a ring of slots in shared memory:
+    the producer writes a frame into a free slot (next_slot/commit, or submit), only the
+    slot number is sent to a worker, which runs analyze on a read-only view of the frame.
+    Results are returned by get/results in the order the frames were committed.
+    A slot is free again as soon as its frame is analyzed. The producer blocks when every
+    slot is in use, and when max_pending results have not been collected yet.
+    analyze must be picklable (e.g. a module-level function), it is sent once to each worker.
+    '''
+
+    def __init__(
+            self,
+            analyze: Callable[[np.ndarray], Any],
+            num_workers: Optional[int] = None,
+            num_slots: Optional[int] = None,
+            num_pixels: int = TLCCS_NUM_PIXELS,
+            dtype: np.dtype = np.float64,
+            max_pending: Optional[int] = None,
+            mp_context = None
+        ):
+
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        if num_slots is None:
+            num_slots = 2 * num_workers
+        if max_pending is None:
+            max_pending = 4 * num_slots
+        if num_slots < 1 or max_pending < num_slots:
+            raise ValueError('num_slots must be at least 1 and max_pending at least num_slots')
+
+        self.num_workers = num_workers
+        self.num_slots = num_slots
+        self.max_pending = max_pending
+        dtype = np.dtype(dtype)
+        shape = (num_slots, num_pixels)
+
+        self._shm = shared_memory.SharedMemory(create=True, size=num_slots * num_pixels * dtype.itemsize)
+        self.frames = np.ndarray(shape, dtype=dtype, buffer=self._shm.buf)
+
+        self._executor = ProcessPoolExecutor(
+            max_workers = num_workers,
+            mp_context = mp_context,
+            initializer = _init_worker,
+            initargs = (self._shm.name, shape, dtype.str, analyze)
+        )
+
+        self._cond = threading.Condition()
+        self._free: Deque[int] = deque(range(num_slots))
+        self._pending: Deque[Tuple[int, float, Future]] = deque()
+        self._slot: Optional[int] = None
+        self._count = 0
+        self._finished = False
+        self._closed = False
+
+    def _release(self, slot: int) -> None:
+        with self._cond:
+            self._free.append(slot)
+            self._cond.notify_all()
+
+    def next_slot(self, timeout: Optional[float] = None) -> np.ndarray:
+        '''
+        view on a free slot, to be filled in place before commit. Blocks until a slot
+        is free and fewer than max_pending results wait to be collected.
+        '''
+
+        with self._cond:
+            if self._finished:
+                raise PipelineClosed
+            if self._slot is None:
+                ready = self._cond.wait_for(
+                    lambda: self._closed or (self._free and len(self._pending) < self.max_pending),
+                    timeout
+                )
+                if not ready:
+                    raise TimeoutError
+                if self._closed:
+                    raise PipelineClosed
+                self._slot = self._free.popleft()
+            return self.frames[self._slot]
+
+    def commit(self, timestamp: Optional[float] = None) -> int:
+        '''dispatch the frame written in next_slot to a worker, returns its index'''
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._cond:
+            if self._slot is None:
+                raise RuntimeError('next_slot must be called before commit')
+            slot, self._slot = self._slot, None
+            future = self._executor.submit(_analyze_slot, slot)
+            future.add_done_callback(lambda f: self._release(slot))
+            index = self._count
+            self._count += 1
+            self._pending.append((index, timestamp, future))
+            self._cond.notify_all()
+            return index
+
+    def submit(self, frame: np.ndarray, timestamp: Optional[float] = None, timeout: Optional[float] = None) -> int:
+        self.next_slot(timeout)[:] = frame
+        return self.commit(timestamp)
+
+    def finish(self) -> None:
+        '''no more frames: results stops once every committed frame is collected'''
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+
+    def get(self, timeout: Optional[float] = None) -> PipelineResult:
+        '''
+        result of the oldest uncollected frame, blocks until it is analyzed.
+        Exceptions raised by analyze are raised here.
+        '''
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._pending or self._finished or self._closed, timeout):
+                raise TimeoutError
+            if not self._pending:
+                raise PipelineClosed
+            index, timestamp, future = self._pending[0]
+
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            result = future.result(remaining)
+        except futures.TimeoutError:
+            raise TimeoutError from None
+        finally:
+            # a failed frame is collected too, with its exception
+            if future.done():
+                with self._cond:
+                    self._pending.popleft()
+                    self._cond.notify_all()
+        return PipelineResult(index, timestamp, result)
+
+    def results(self, timeout: Optional[float] = None) -> Iterator[PipelineResult]:
+        '''results in frame order, until finish was called and every result was collected'''
+
+        while True:
+            try:
+                yield self.get(timeout)
+            except PipelineClosed:
+                return
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def close(self) -> None:
+        '''stop the workers and release the shared memory, uncollected results are lost'''
+
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._finished = True
+            for _, _, future in self._pending:
+                future.cancel()
+            self._cond.notify_all()
+
+        self._executor.shutdown(wait=True)
+        self.frames = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+def feed_continuous(
+        tlccs: TLCCS,
+        pipeline: FramePipeline,
+        num_frames: Optional[int] = None,
+        duration: Optional[float] = None,
+        stop_event: Optional[threading.Event] = None,
+        on_overexposure: Optional[Callable[[float], None]] = None
+    ) -> int:
+    '''
+    Run the spectrometer in continuous mode and decode every frame, factory corrected,
+    straight into a slot of the pipeline, until num_frames frames were dispatched, duration
+    seconds elapsed or stop_event is set. Overexposed frames are skipped. Calls
+    pipeline.finish at the end and returns the number of frames dispatched.
+    Typically runs on its own thread while another one collects the results.
+    '''
+
+    raw = allocate_raw_buffer()
+    deadline = None if duration is None else time.monotonic() + duration
+    dispatched = 0
+
+    tlccs.start_continuous_scan()
+    try:
+        while (
+            (num_frames is None or dispatched < num_frames)
+            and (deadline is None or time.monotonic() < deadline)
+            and (stop_event is None or not stop_event.is_set())
+        ):
+            out = pipeline.next_slot()
+            try:
+                tlccs.get_scan_data_factory(raw=raw, out=out)
+            except Overexposure:
+                if on_overexposure is not None:
+                    on_overexposure(time.time())
+                continue
+
+            pipeline.commit()
+            dispatched += 1
+    finally:
+        tlccs.reset()
+        pipeline.finish()
+
+    return dispatched
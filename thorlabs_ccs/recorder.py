@@ -0,0 +1,308 @@
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional, Union
+import numpy as np
+
+from .tlccs import (
+    TLCCS, TLCCS_NUM_PIXELS, TLCCS_NUM_RAW_PIXELS, Overexposure,
+    allocate_raw_buffer
+)
+
+RECORDING_MAGIC = b'TLCCSREC'
+RECORDING_VERSION = 1
+RECORDING_ALIGNMENT = 4096
+DEFAULT_CHUNK_FRAMES = 1024
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('header_size', '<u4'),
+    ('frame_dtype', 'S8'),
+    ('num_pixels', '<u4'),
+    ('num_wavelengths', '<u4'),
+    ('frame_count', '<u8'),
+    ('int_time', '<f8'),
+    ('created', '<f8'),
+    ('serial_number', 'S32'),
+])
+
+FRAME_DTYPES = (np.dtype('<u2'), np.dtype('<f4'))
+
+class InvalidRecording(Exception): ...
+
+def record_dtype(frame_dtype: np.dtype, num_pixels: int) -> np.dtype:
+    '''one record per frame: host timestamp followed by the pixels'''
+    return np.dtype([('timestamp', '<f8'), ('frame', frame_dtype, (num_pixels,))])
+
+def _header_size(num_wavelengths: int) -> int:
+    size = HEADER_DTYPE.itemsize + num_wavelengths * np.dtype('<f8').itemsize
+    return -(-size // RECORDING_ALIGNMENT) * RECORDING_ALIGNMENT
+
+class Recording:
+    '''
+    Read access to a recording file, also while it is being written.
+    frames and timestamps are memory-mapped: slicing them only reads the
+    requested range from disk.
+    '''
+
+    def __init__(self, filename: Path):
+
+        self.filename = Path(filename)
+        header = np.fromfile(self.filename, dtype=HEADER_DTYPE, count=1)
+        if len(header) != 1 or header['magic'][0] != RECORDING_MAGIC:
+            raise InvalidRecording(f'{filename} is not a spectrum recording')
+        if header['version'][0] != RECORDING_VERSION:
+            raise InvalidRecording(f'unsupported recording version {header["version"][0]}')
+
+        self.header = header[0]
+        self.num_pixels = int(self.header['num_pixels'])
+        self.frame_dtype = np.dtype(self.header['frame_dtype'].decode())
+        self.int_time = float(self.header['int_time'])
+        self.created = float(self.header['created'])
+        self.serial_number = self.header['serial_number'].decode()
+        # for raw frames, the axis of the pixels starting at SCAN_PIXELS_OFFSET
+        self.wavelength = np.fromfile(
+            self.filename,
+            dtype = '<f8',
+            count = int(self.header['num_wavelengths']),
+            offset = HEADER_DTYPE.itemsize
+        )
+        self._header_size = int(self.header['header_size'])
+        self._record_dtype = record_dtype(self.frame_dtype, self.num_pixels)
+        self._records = None
+        self.refresh()
+
+    def refresh(self) -> int:
+        '''pick up frames appended since the file was opened, returns the frame count'''
+
+        count = int(np.fromfile(self.filename, dtype=HEADER_DTYPE, count=1)['frame_count'][0])
+        if count == 0:
+            self._records = np.zeros((0,), dtype=self._record_dtype)
+        else:
+            self._records = np.memmap(
+                self.filename,
+                dtype = self._record_dtype,
+                mode = 'r',
+                offset = self._header_size,
+                shape = (count,)
+            )
+        return count
+
+    @property
+    def frames(self) -> np.ndarray:
+        return self._records['frame']
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._records['timestamp']
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, index) -> np.ndarray:
+        return self._records['frame'][index]
+
+    def close(self) -> None:
+        self._records = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+class SpectrumRecorder:
+    '''
+    Appends frames to a memory-mapped file, grown chunk_frames at a time, so that
+    an append is a copy into an already mapped page and memory use does not grow
+    with the length of the recording. The frame count in the header is updated on
+    every append, so the file stays readable if the process dies.
+    Frames are either raw ADC frames (uint16, TLCCS_NUM_RAW_PIXELS) or processed
+    spectra (float32, TLCCS_NUM_PIXELS).
+    '''
+
+    def __init__(
+            self,
+            filename: Path,
+            frame_dtype: Union[str, np.dtype] = np.float32,
+            num_pixels: Optional[int] = None,
+            wavelength: Optional[np.ndarray] = None,
+            int_time: float = 0.0,
+            serial_number: str = '',
+            chunk_frames: int = DEFAULT_CHUNK_FRAMES
+        ):
+
+        frame_dtype = np.dtype(frame_dtype).newbyteorder('<')
+        if frame_dtype not in FRAME_DTYPES:
+            raise ValueError('frames must be uint16 (raw) or float32')
+        if num_pixels is None:
+            num_pixels = TLCCS_NUM_RAW_PIXELS if frame_dtype.kind == 'u' else TLCCS_NUM_PIXELS
+        if chunk_frames < 1:
+            raise ValueError('chunk_frames must be at least 1')
+
+        self.filename = Path(filename)
+        self.frame_dtype = frame_dtype
+        self.num_pixels = num_pixels
+        self.chunk_frames = chunk_frames
+        self._record_dtype = record_dtype(frame_dtype, num_pixels)
+
+        axis = np.zeros((0,), dtype='<f8') if wavelength is None else np.asarray(wavelength, dtype='<f8')
+        self._header_size = _header_size(len(axis))
+
+        header = np.zeros((1,), dtype=HEADER_DTYPE)
+        header['magic'] = RECORDING_MAGIC
+        header['version'] = RECORDING_VERSION
+        header['header_size'] = self._header_size
+        header['frame_dtype'] = frame_dtype.str.encode()
+        header['num_pixels'] = num_pixels
+        header['num_wavelengths'] = len(axis)
+        header['int_time'] = int_time
+        header['created'] = time.time()
+        header['serial_number'] = serial_number.encode()[:HEADER_DTYPE['serial_number'].itemsize]
+
+        with open(self.filename, 'wb') as f:
+            f.write(header.tobytes())
+            f.write(axis.tobytes())
+            f.truncate(self._header_size)
+
+        self._header = np.memmap(self.filename, dtype=HEADER_DTYPE, mode='r+', shape=(1,))
+        self._frame_count = self._header['frame_count'].view(np.ndarray)
+        self._records: Optional[np.memmap] = None
+        self._capacity = 0
+        self._count = 0
+        self._grow()
+
+    @classmethod
+    def for_tlccs(cls, tlccs: TLCCS, filename: Path, raw: bool = False, **kwargs) -> 'SpectrumRecorder':
+        '''recorder with the header filled from an open spectrometer'''
+
+        return cls(
+            filename,
+            frame_dtype = np.uint16 if raw else np.float32,
+            wavelength = np.asarray(tlccs.get_wavelength()),
+            int_time = tlccs.data.int_time,
+            serial_number = tlccs.device_info.serial_number,
+            **kwargs
+        )
+
+    def _grow(self) -> None:
+
+        if self._records is not None:
+            self._records.flush()
+            self._records = self._frames = self._timestamps = None
+
+        self._capacity += self.chunk_frames
+        with open(self.filename, 'r+b') as f:
+            f.truncate(self._header_size + self._capacity * self._record_dtype.itemsize)
+
+        self._records = np.memmap(
+            self.filename,
+            dtype = self._record_dtype,
+            mode = 'r+',
+            offset = self._header_size,
+            shape = (self._capacity,)
+        )
+        # plain ndarray views on the fields, indexing a memmap subclass is slow
+        self._frames = self._records['frame'].view(np.ndarray)
+        self._timestamps = self._records['timestamp'].view(np.ndarray)
+
+    def next_frame(self) -> np.ndarray:
+        '''view on the slot of the next frame, to be filled in place before commit'''
+
+        if self._count == self._capacity:
+            self._grow()
+        return self._frames[self._count]
+
+    def commit(self, timestamp: Optional[float] = None) -> int:
+        '''publish the frame written in next_frame, returns its index'''
+
+        self._timestamps[self._count] = time.time() if timestamp is None else timestamp
+        self._count += 1
+        self._frame_count[0] = self._count
+        return self._count - 1
+
+    def append(self, frame: np.ndarray, timestamp: Optional[float] = None) -> int:
+        self.next_frame()[:] = frame
+        return self.commit(timestamp)
+
+    @property
+    def frames(self) -> np.ndarray:
+        return self._frames[:self._count]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps[:self._count]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index) -> np.ndarray:
+        return self.frames[index]
+
+    def flush(self) -> None:
+        self._records.flush()
+        self._header.flush()
+
+    def close(self) -> None:
+        '''flush and trim the file to the recorded frames'''
+
+        if self._records is None:
+            return
+
+        self.flush()
+        self._records = self._frames = self._timestamps = None
+        self._header = self._frame_count = None
+        with open(self.filename, 'r+b') as f:
+            f.truncate(self._header_size + self._count * self._record_dtype.itemsize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+def record_continuous(
+        tlccs: TLCCS,
+        recorder: SpectrumRecorder,
+        num_frames: Optional[int] = None,
+        duration: Optional[float] = None,
+        stop_event: Optional[threading.Event] = None,
+        on_overexposure: Optional[Callable[[float], None]] = None
+    ) -> int:
+    '''
+    Run the spectrometer in continuous mode and append every frame to the recorder,
+    until num_frames frames were recorded, duration seconds elapsed or stop_event is set.
+    Spectra are factory corrected and decoded straight into the file; overexposed
+    spectra are skipped (raw frames are always recorded). Returns the number of frames recorded.
+    '''
+
+    raw_mode = recorder.frame_dtype.kind == 'u'
+    raw = allocate_raw_buffer()
+    deadline = None if duration is None else time.monotonic() + duration
+    recorded = 0
+
+    tlccs.start_continuous_scan()
+    try:
+        while (
+            (num_frames is None or recorded < num_frames)
+            and (deadline is None or time.monotonic() < deadline)
+            and (stop_event is None or not stop_event.is_set())
+        ):
+            out = recorder.next_frame()
+            try:
+                if raw_mode:
+                    out[:] = tlccs.get_raw_scan_data(raw)
+                else:
+                    tlccs.get_scan_data_factory(raw=raw, out=out)
+            except Overexposure:
+                if on_overexposure is not None:
+                    on_overexposure(time.time())
+                continue
+
+            recorder.commit()
+            recorded += 1
+    finally:
+        tlccs.reset()
+
+    return recorded
@@ -0,0 +1,208 @@
+from typing import Optional, Tuple
+import numpy as np
+
+from .tlccs import (
+    TLCCS, TLCCS_WL_CAL, TLCCS_CAL_DATA_SET_FACTORY,
+    wavelength_array
+)
+
+RESAMPLING_LINEAR = 0
+RESAMPLING_AREA = 1
+
+def uniform_grid(start: float, stop: float, step: float) -> np.ndarray:
+    '''wavelengths from start to stop (included when on the grid) every step nm'''
+    num = int(np.floor((stop - start) / step + 1e-9)) + 1
+    return start + step * np.arange(num)
+
+def _edges(centers: np.ndarray) -> np.ndarray:
+    '''bin edges halfway between increasing centers, the outer bins are symmetric'''
+
+    mid = (centers[1:] + centers[:-1]) / 2
+    return np.concatenate(([2*centers[0] - mid[0]], mid, [2*centers[-1] - mid[-1]]))
+
+def linear_weights(wl: np.ndarray, grid: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    COO (rows, cols, weights) of linear interpolation from an increasing axis wl onto grid,
+    grid points outside of wl have no entries
+    '''
+
+    inside = np.flatnonzero((grid >= wl[0]) & (grid <= wl[-1]))
+    x = grid[inside]
+    left = np.clip(np.searchsorted(wl, x, side='right') - 1, 0, len(wl) - 2)
+    t = (x - wl[left]) / (wl[left+1] - wl[left])
+
+    rows = np.repeat(inside, 2)
+    cols = np.stack((left, left + 1), axis=-1).ravel()
+    weights = np.stack((1 - t, t), axis=-1).ravel()
+    return rows, cols, weights
+
+def area_weights(wl: np.ndarray, grid: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    COO (rows, cols, weights) of area-conserving binning from an increasing axis wl onto grid:
+    each output is the mean of the input over its bin, weighted by the overlap of the pixel bins.
+    Grid bins not fully covered by the pixels have no entries.
+    '''
+
+    src = _edges(wl)
+    dst = _edges(grid)
+    inside = np.flatnonzero((dst[:-1] >= src[0]) & (dst[1:] <= src[-1]))
+    lo = dst[inside]
+    hi = dst[inside+1]
+
+    first = np.clip(np.searchsorted(src, lo, side='right') - 1, 0, len(wl) - 1)
+    last = np.clip(np.searchsorted(src, hi, side='left') - 1, 0, len(wl) - 1)
+    counts = last - first + 1
+
+    rows = np.repeat(inside, counts)
+    segment = np.repeat(np.cumsum(counts) - counts, counts)
+    cols = np.repeat(first, counts) + np.arange(counts.sum()) - segment
+    overlap = (
+        np.minimum(src[cols+1], np.repeat(hi, counts))
+        - np.maximum(src[cols], np.repeat(lo, counts))
+    )
+    weights = overlap / np.repeat(hi - lo, counts)
+
+    keep = weights > 0
+    return rows[keep], cols[keep], weights[keep]
+
+class SpectralResampler:
+    '''
+    Resamples spectra from the pixel axis of a spectrometer onto a fixed wavelength grid,
+    for a single frame or a batch of frames (..., num_pixels). Grid points outside of the
+    calibrated range are set to fill_value.
+    The resampling matrix is banded, so instead of a sparse product apply uses precomputed
+    gathers: the two neighbouring pixels for linear interpolation, and the bin boundaries on
+    the cumulative integral of the spectrum for area-conserving binning. matrix() returns
+    the equivalent dense matrix.
+    '''
+
+    def __init__(
+            self,
+            wavelength: np.ndarray,
+            grid: np.ndarray,
+            mode: int = RESAMPLING_LINEAR,
+            fill_value: float = np.nan
+        ):
+
+        wavelength = np.asarray(wavelength, dtype=np.float64)
+        grid = np.asarray(grid, dtype=np.float64)
+        if grid.ndim != 1 or len(grid) < 2 or np.any(np.diff(grid) <= 0):
+            raise ValueError('grid must be strictly increasing')
+        if mode not in (RESAMPLING_LINEAR, RESAMPLING_AREA):
+            raise ValueError(f'unknown resampling mode {mode}')
+
+        # descending calibrations: work on the pixels in increasing wavelength order
+        self._reversed = bool(wavelength[0] > wavelength[-1])
+        self._order = np.arange(len(wavelength))[::-1] if self._reversed else np.arange(len(wavelength))
+        sorted_wl = wavelength[self._order]
+        if np.any(np.diff(sorted_wl) <= 0):
+            raise ValueError('wavelength axis must be strictly monotonic')
+
+        self.wavelength = wavelength
+        self.grid = grid
+        self.mode = mode
+        self.fill_value = fill_value
+        self.num_pixels = len(wavelength)
+
+        if mode == RESAMPLING_LINEAR:
+            self._valid = np.flatnonzero((grid >= sorted_wl[0]) & (grid <= sorted_wl[-1]))
+            x = grid[self._valid]
+            left = np.clip(np.searchsorted(sorted_wl, x, side='right') - 1, 0, self.num_pixels - 2)
+            t = (x - sorted_wl[left]) / (sorted_wl[left+1] - sorted_wl[left])
+            self._index = (left, left + 1)
+            self._coef = (1 - t, t)
+        else:
+            src = _edges(sorted_wl)
+            dst = _edges(grid)
+            self._valid = np.flatnonzero((dst[:-1] >= src[0]) & (dst[1:] <= src[-1]))
+            lo = dst[self._valid]
+            hi = dst[self._valid+1]
+            # integral up to x = cumulative[j] + spectrum[j] * (x - src[j]), src[j] <= x < src[j+1]
+            lo_pixel = np.clip(np.searchsorted(src, lo, side='right') - 1, 0, self.num_pixels - 1)
+            hi_pixel = np.clip(np.searchsorted(src, hi, side='right') - 1, 0, self.num_pixels - 1)
+            inv_width = 1 / (hi - lo)
+            self._pixel_width = np.diff(src)
+            self._index = (lo_pixel, hi_pixel)
+            self._coef = ((lo - src[lo_pixel]) * inv_width, (hi - src[hi_pixel]) * inv_width, inv_width)
+
+        if len(self._valid) == 0:
+            raise ValueError('grid does not overlap the wavelength axis')
+        self._coef32 = tuple(c.astype(np.float32) for c in self._coef)
+
+    @classmethod
+    def from_calibration(cls, cal: TLCCS_WL_CAL, grid: np.ndarray, **kwargs) -> 'SpectralResampler':
+        return cls(wavelength_array(cal.poly), grid, **kwargs)
+
+    @classmethod
+    def for_tlccs(
+            cls,
+            tlccs: TLCCS,
+            grid: np.ndarray,
+            factory_or_user: int = TLCCS_CAL_DATA_SET_FACTORY,
+            **kwargs
+        ) -> 'SpectralResampler':
+        return cls(tlccs.get_wavelength(factory_or_user), grid, **kwargs)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return (len(self.grid), self.num_pixels)
+
+    def coo(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''(rows, cols, weights) of the resampling matrix'''
+
+        sorted_wl = self.wavelength[self._order]
+        if self.mode == RESAMPLING_LINEAR:
+            rows, cols, weights = linear_weights(sorted_wl, self.grid)
+        else:
+            rows, cols, weights = area_weights(sorted_wl, self.grid)
+        return rows, self._order[cols], weights
+
+    def matrix(self) -> np.ndarray:
+        '''dense (len(grid), num_pixels) resampling matrix'''
+
+        rows, cols, weights = self.coo()
+        dense = np.zeros(self.shape)
+        np.add.at(dense, (rows, cols), weights)
+        return dense
+
+    def apply(self, spectra: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        '''resample one spectrum (num_pixels,) or a batch (..., num_pixels) onto the grid'''
+
+        spectra = np.asarray(spectra)
+        if spectra.shape[-1] != self.num_pixels:
+            raise ValueError(f'expected {self.num_pixels} pixels, got {spectra.shape[-1]}')
+
+        dtype = np.float32 if spectra.dtype == np.float32 else np.float64
+        if self._reversed:
+            spectra = spectra[..., ::-1]
+
+        lo_pixel, hi_pixel = self._index
+        if self.mode == RESAMPLING_LINEAR:
+            coef = self._coef32 if dtype == np.float32 else self._coef
+            res = np.take(spectra, lo_pixel, axis=-1).astype(dtype, copy=False)
+            res *= coef[0]
+            hi = np.take(spectra, hi_pixel, axis=-1).astype(dtype, copy=False)
+            hi *= coef[1]
+            res += hi
+        else:
+            lo_frac, hi_frac, inv_width = self._coef
+            cumulative = np.zeros(spectra.shape[:-1] + (self.num_pixels + 1,))
+            np.cumsum(spectra * self._pixel_width, axis=-1, out=cumulative[..., 1:])
+            res = np.take(cumulative, hi_pixel, axis=-1)
+            res -= np.take(cumulative, lo_pixel, axis=-1)
+            res *= inv_width
+            res += np.take(spectra, hi_pixel, axis=-1) * hi_frac
+            res -= np.take(spectra, lo_pixel, axis=-1) * lo_frac
+
+        if out is None and len(self._valid) == len(self.grid) and res.dtype == dtype:
+            return res
+
+        if out is None:
+            out = np.empty(spectra.shape[:-1] + (len(self.grid),), dtype=dtype)
+        out[..., self._valid] = res
+        if len(self._valid) < len(self.grid):
+            out[..., :self._valid[0]] = self.fill_value
+            out[..., self._valid[-1]+1:] = self.fill_value
+        return out
+
+    __call__ = apply
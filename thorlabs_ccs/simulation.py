@@ -0,0 +1,305 @@
+import array
+import itertools
+import struct
+import threading
+import time
+import usb.core
+from pathlib import Path
+from typing import Callable, Optional, Tuple, Union
+import numpy as np
+
+from .tlccs import (
+    THORLABS_VID, CCS100_PID, CCS125_PID, CCS150_PID, CCS175_PID, CCS200_PID,
+    TLCCS_NUM_PIXELS, TLCCS_NUM_RAW_PIXELS, TLCCS_NUM_POLY_POINTS, TLCCS_DEF_INT_TIME,
+    TLCCS_SERIAL_NO_LENGTH, MAX_ADC_VALUE,
+    TLCCS_RCMD_READ_EEPROM, TLCCS_RCMD_READ_RAM, TLCCS_RCMD_GET_STATUS,
+    TLCCS_WCMD_INTEGRATION_TIME, TLCCS_WCMD_MODUS, TLCCS_WCMD_RESET,
+    TLCCS_STATUS_SCAN_IDLE, TLCCS_STATUS_SCAN_TRIGGERED, TLCCS_STATUS_SCAN_TRANSFER,
+    TLCCS_STATUS_WAIT_FOR_EXT_TRIG, TLCCS_TIMEOUT_DEF,
+    MODUS_INTERN_SINGLE_SHOT, MODUS_INTERN_CONTINUOUS, MODUS_EXTERN_SINGLE_SHOT, MODUS_EXTERN_CONTINUOUS,
+    DARK_PIXELS_OFFSET, NO_DARK_PIXELS, SCAN_PIXELS_OFFSET, UINT16_SZ,
+    EE_VENDOR_ID, EE_PRODUCT_ID, EE_SERIAL_NO, EE_FACT_CAL_COEF_DATA,
+    EE_EVEN_OFFSET_MAX, EE_ODD_OFFSET_MAX, EE_ACOR_FACTORY, EE_ACOR_USER,
+    DevInfo, crc16_block, encode_integration_time, decode_integration_time
+)
+
+SIMULATED_EEPROM_SIZE = 0x8000
+SIMULATED_BUS = 0xFF # keeps simulated devices apart from real ones in the registry
+
+# approximate wavelength range of each model, nm
+SIMULATED_WAVELENGTH_RANGE = {
+    CCS100_PID: (350.0, 700.0),
+    CCS125_PID: (500.0, 1000.0),
+    CCS150_PID: (200.0, 1000.0),
+    CCS175_PID: (500.0, 1000.0),
+    CCS200_PID: (200.0, 1000.0),
+}
+
+_addresses = itertools.count(1)
+
+def _put(image: bytearray, address: int, payload: bytes, checksum: bool = True) -> None:
+    image[address:address+len(payload)] = payload
+    if checksum:
+        crc = crc16_block(payload, len(payload))
+        image[address+len(payload):address+len(payload)+UINT16_SZ] = struct.pack('<H', crc)
+
+def synthesize_eeprom_image(
+        serial_number: str = 'M00000000',
+        pid: int = CCS100_PID,
+        poly: Optional[Tuple[float, ...]] = None,
+        amplitude_cor: Optional[np.ndarray] = None,
+        offset_max: Tuple[int, int] = (1200, 1200)
+    ) -> bytes:
+    '''
+    EEPROM content with a factory wavelength calibration, dark offsets and
+    amplitude corrections, laid out and checksummed like a real device.
+    No user calibration points are stored.
+    '''
+
+    if poly is None:
+        wl_min, wl_max = SIMULATED_WAVELENGTH_RANGE.get(pid, SIMULATED_WAVELENGTH_RANGE[CCS100_PID])
+        # slightly curved dispersion, as on real gratings
+        slope = (wl_max - wl_min) / (TLCCS_NUM_PIXELS - 1)
+        poly = (wl_min, slope * 1.05, -slope * 0.05 / (TLCCS_NUM_PIXELS - 1), 0.0)
+
+    if amplitude_cor is None:
+        amplitude_cor = np.ones((TLCCS_NUM_PIXELS,), dtype=np.float32)
+
+    image = bytearray(b'\xff' * SIMULATED_EEPROM_SIZE)
+    _put(image, EE_VENDOR_ID, struct.pack('<H', THORLABS_VID), checksum=False)
+    _put(image, EE_PRODUCT_ID, struct.pack('<H', pid), checksum=False)
+    _put(image, EE_SERIAL_NO, serial_number.encode('ascii')[:TLCCS_SERIAL_NO_LENGTH].ljust(TLCCS_SERIAL_NO_LENGTH, b'\0'), checksum=False)
+    _put(image, EE_FACT_CAL_COEF_DATA, struct.pack('<' + 'd'*TLCCS_NUM_POLY_POINTS, *poly))
+    _put(image, EE_EVEN_OFFSET_MAX, struct.pack('<H', offset_max[0]))
+    _put(image, EE_ODD_OFFSET_MAX, struct.pack('<H', offset_max[1]))
+    _put(image, EE_ACOR_FACTORY, np.asarray(amplitude_cor, dtype='<f4').tobytes())
+    _put(image, EE_ACOR_USER, np.asarray(amplitude_cor, dtype='<f4').tobytes())
+    return bytes(image)
+
+def default_spectrum(num_pixels: int = TLCCS_NUM_PIXELS) -> np.ndarray:
+    '''a broad background with a few emission lines, in ADC counts per second'''
+
+    x = np.arange(num_pixels, dtype=np.float64)
+    background = 2e4 * np.exp(-0.5 * ((x - 0.45*num_pixels) / (0.3*num_pixels))**2)
+    lines = sum(
+        amplitude * np.exp(-0.5 * ((x - center*num_pixels) / 4.0)**2)
+        for center, amplitude in ((0.2, 3e5), (0.48, 6e5), (0.71, 2e5))
+    )
+    return background + lines
+
+class _SimulatedContext:
+    '''stands in for the pyusb device context, so that usb.util.dispose_resources works'''
+
+    def dispose(self, device, close_handle: bool = True) -> None:
+        pass
+
+class SimulatedCCS:
+    '''
+    Software stand-in for a programmed CCS spectrometer, usable wherever TLCCS
+    expects a usb.core.Device. Control requests (EEPROM/RAM reads, status,
+    integration time, scan modes, reset) are answered from memory and bulk reads
+    on endpoint 0x86 return raw frames at the pace of the integration time.
+    Register it with the USB registry to open it through TLCCS:
+
+        sim = SimulatedCCS()
+        get_registry().register(sim)
+        ccs = TLCCS(sim.device_info)
+    '''
+
+    def __init__(
+            self,
+            eeprom: Union[bytes, Path, None] = None,
+            serial_number: str = 'M00000000',
+            pid: int = CCS100_PID,
+            spectrum: Union[np.ndarray, Callable[[float], np.ndarray], None] = None,
+            dark_level: float = 1000.0,
+            read_noise: float = 5.0,
+            seed: Optional[int] = None,
+            port_numbers: Tuple = ()
+        ):
+
+        if eeprom is None:
+            eeprom = synthesize_eeprom_image(serial_number, pid)
+        elif not isinstance(eeprom, (bytes, bytearray, memoryview)):
+            eeprom = Path(eeprom).read_bytes()
+        self.eeprom = bytes(eeprom)
+        self.ram = bytearray(0x10000)
+
+        self.idVendor = THORLABS_VID
+        self.idProduct = pid
+        self.serial_number = serial_number
+        self.bus = SIMULATED_BUS
+        self.address = next(_addresses)
+        self.port_numbers = port_numbers
+        self._ctx = _SimulatedContext()
+
+        # counts per second per pixel, or a function of the time since the scan started
+        self.spectrum = default_spectrum() if spectrum is None else spectrum
+        self.dark_level = dark_level
+        self.read_noise = read_noise
+        self.rng = np.random.default_rng(seed)
+
+        self._cond = threading.Condition()
+        self._int_time_bytes = bytes(encode_integration_time(TLCCS_DEF_INT_TIME))
+        self.int_time = decode_integration_time(self._int_time_bytes)
+        self._modus: Optional[int] = None
+        self._armed = False # waiting for an external trigger
+        self._frame_start: Optional[float] = None
+        self.frames_sent = 0
+
+    @property
+    def device_info(self) -> DevInfo:
+        return DevInfo(
+            vid = self.idVendor,
+            pid = self.idProduct,
+            serial_number = self.serial_number
+        )
+
+    def set_configuration(self, configuration = None) -> None:
+        pass
+
+    def reset(self) -> None:
+        self._stop()
+
+    def _stop(self) -> None:
+        with self._cond:
+            self._modus = None
+            self._armed = False
+            self._frame_start = None
+            self._cond.notify_all()
+
+    def trigger(self) -> None:
+        '''simulate a pulse on the external trigger input'''
+
+        with self._cond:
+            if self._armed:
+                self._armed = False
+                self._frame_start = time.monotonic()
+                self._cond.notify_all()
+
+    def _status(self) -> int:
+
+        with self._cond:
+            if self._armed:
+                return TLCCS_STATUS_WAIT_FOR_EXT_TRIG
+            if self._frame_start is None:
+                return TLCCS_STATUS_SCAN_IDLE
+            if time.monotonic() >= self._frame_start + self.int_time:
+                return TLCCS_STATUS_SCAN_TRANSFER
+            return TLCCS_STATUS_SCAN_TRIGGERED
+
+    def _set_modus(self, modus: int) -> None:
+
+        if modus not in (MODUS_INTERN_SINGLE_SHOT, MODUS_INTERN_CONTINUOUS, MODUS_EXTERN_SINGLE_SHOT, MODUS_EXTERN_CONTINUOUS):
+            raise usb.core.USBError(f'invalid modus {modus}')
+
+        with self._cond:
+            self._modus = modus
+            if modus in (MODUS_EXTERN_SINGLE_SHOT, MODUS_EXTERN_CONTINUOUS):
+                self._armed = True
+                self._frame_start = None
+            else:
+                self._armed = False
+                self._frame_start = time.monotonic()
+            self._cond.notify_all()
+
+    def ctrl_transfer(
+            self,
+            bmRequestType: int,
+            bRequest: int,
+            wValue: int = 0,
+            wIndex: int = 0,
+            data_or_wLength = None,
+            timeout = None
+        ):
+
+        # device to host
+        if bmRequestType & 0x80:
+            length = data_or_wLength or 0
+            if bRequest == TLCCS_RCMD_READ_EEPROM:
+                return array.array('B', self.eeprom[wValue:wValue+length])
+            if bRequest == TLCCS_RCMD_READ_RAM:
+                return array.array('B', self.ram[wValue:wValue+length])
+            if bRequest == TLCCS_RCMD_GET_STATUS:
+                return array.array('B', struct.pack('<H', self._status()))
+            if bRequest == TLCCS_WCMD_INTEGRATION_TIME:
+                return array.array('B', self._int_time_bytes[:length])
+            raise usb.core.USBError(f'unsupported request 0x{bRequest:02x}')
+
+        # host to device
+        data = bytes(data_or_wLength) if data_or_wLength and not isinstance(data_or_wLength, int) else b''
+        if bRequest == TLCCS_WCMD_INTEGRATION_TIME:
+            self._int_time_bytes = data
+            self.int_time = decode_integration_time(data)
+        elif bRequest == TLCCS_WCMD_MODUS:
+            self._set_modus(wValue)
+        elif bRequest == TLCCS_WCMD_RESET:
+            self._stop()
+        elif bRequest == TLCCS_RCMD_READ_RAM:
+            self.ram[wValue:wValue+len(data)] = data
+        else:
+            raise usb.core.USBError(f'unsupported request 0x{bRequest:02x}')
+        return len(data)
+
+    def _frame(self, scan_start: float) -> np.ndarray:
+
+        if callable(self.spectrum):
+            signal = self.spectrum(scan_start)
+        else:
+            signal = self.spectrum
+
+        raw = np.empty((TLCCS_NUM_RAW_PIXELS,), dtype=np.float64)
+        raw.fill(self.dark_level)
+        raw[SCAN_PIXELS_OFFSET:SCAN_PIXELS_OFFSET+TLCCS_NUM_PIXELS] += signal * self.int_time
+        if self.read_noise:
+            raw += self.rng.normal(0, self.read_noise, raw.shape)
+        # the dark pixels saturate with the rest of the sensor
+        saturated = raw[SCAN_PIXELS_OFFSET:].max() >= MAX_ADC_VALUE
+        if saturated:
+            raw[DARK_PIXELS_OFFSET:DARK_PIXELS_OFFSET+NO_DARK_PIXELS] = MAX_ADC_VALUE
+        return np.clip(raw, 0, MAX_ADC_VALUE).astype('<u2')
+
+    def read(self, endpoint: int, size_or_buffer, timeout = None):
+        '''bulk read, blocks until the current scan is complete'''
+
+        if endpoint != 0x86:
+            raise usb.core.USBError(f'unsupported endpoint 0x{endpoint:02x}')
+
+        if timeout is None:
+            timeout = TLCCS_TIMEOUT_DEF
+        deadline = time.monotonic() + timeout / 1000.0
+
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._frame_start is not None and now >= self._frame_start + self.int_time:
+                    break
+                if now >= deadline:
+                    raise usb.core.USBTimeoutError('Operation timed out')
+                if self._frame_start is not None:
+                    wait = min(self._frame_start + self.int_time, deadline) - now
+                else:
+                    wait = deadline - now
+                self._cond.wait(wait)
+
+            scan_start = self._frame_start
+            if self._modus == MODUS_INTERN_CONTINUOUS:
+                # the next frame is integrated while this one is transferred, but not before a late read
+                self._frame_start = max(scan_start + self.int_time, time.monotonic())
+            elif self._modus == MODUS_EXTERN_CONTINUOUS:
+                self._armed = True
+                self._frame_start = None
+            else:
+                self._modus = None
+                self._frame_start = None
+            self.frames_sent += 1
+
+        frame = self._frame(scan_start).tobytes()
+
+        if isinstance(size_or_buffer, int):
+            return array.array('B', frame[:size_or_buffer])
+
+        buffer = memoryview(size_or_buffer).cast('B')
+        count = min(len(buffer), len(frame))
+        buffer[:count] = frame[:count]
+        return count
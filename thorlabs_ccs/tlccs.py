@@ -9,22 +9,23 @@
 
 
 from dataclasses import dataclass, field
+from collections import OrderedDict
 import array
 import usb.core
 import usb.util
 import struct
 import time
 import math
-from typing import Optional, Tuple, NamedTuple, Dict, List
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, NamedTuple, Dict, List, Union, Iterator, Callable
 import numpy as np
 from pathlib import Path
+from thorlabs_usb import get_registry
 
-import sys
-if sys.platform == 'win32':
-    import libusb_package
-    libusb_backend = libusb_package.get_libusb1_backend()
-else:
-    libusb_backend = None
+logger = logging.getLogger(__name__)
 
 class EEPROMChecksumError(Exception): ...
 class InvalidUserData(Exception): ...
@@ -32,9 +33,10 @@ class Overexposure(Exception): ...
 class DeviceNotFound(Exception): ...
 class NoUserDataPoint(Exception): ...
 class RenumerationFailed(Exception): ...
+class ScanTimeout(Exception): ...
 
 THORLABS_VID = 0x1313
-PID_RANGE = (0x8080, 0x8089)
+PID_RANGE = (0x8080, 0x8089) # inclusive
 CCS100_PID_U = 0x8080  # CCS100 Compact Spectrometer
 CCS100_PID = 0x8081  # CCS100 Compact Spectrometer
 CCS125_PID_U = 0x8082  # CCS125 Special Spectrometer
@@ -67,6 +69,10 @@ TLCCS_DEF_INT_TIME = 0.01
 TLCCS_NUM_RAW_PIXELS = 3694
 SH_PERCENT = 16.5
 TLCCS_NUM_INTEG_CTRL_BYTES = 6
+SCAN_SLEEP_FRACTION = 0.9 # sleep through this fraction of the integration time before polling the status
+SCAN_POLLS_PER_INT_TIME = 20 # poll the status at most this many times per integration time...
+SCAN_POLL_INTERVAL_MIN = 0.0005 # ...but not faster than every 0.5 ms...
+SCAN_POLL_INTERVAL_MAX = 0.01 # ...nor slower than every 10 ms
 
 TLCCS_RCMD_READ_EEPROM = 0x21
 TLCCS_RCMD_READ_RAM = 0xA0
@@ -94,6 +100,11 @@ MODUS_INTERN_CONTINUOUS = 1
 MODUS_EXTERN_SINGLE_SHOT = 2
 MODUS_EXTERN_CONTINUOUS = 3
 
+CORRECTION_MODE_FACTORY = 0
+CORRECTION_MODE_RANGE = 1
+CORRECTION_MODE_NOISE = 2
+DEFAULT_CORRECTION_PLAN_CACHE_SIZE = 16
+
 CHAR_SZ = 1
 REAL64_SZ = 8
 REAL32_SZ = 4
@@ -172,24 +183,67 @@ EE_CHECKSUMS                      = EE_FLAGS                  + EE_SIZE_FLAGS
 EE_FREE                           = EE_CHECKSUMS              + EE_SIZE_CHECKSUMS              # free memory 
 
 
-@dataclass
-class TLCCS_WL_CAL:
-    poly: array.array = field(default_factory=lambda: array.array('d', [0]*TLCCS_NUM_POLY_POINTS))
-    min: float = 0
-    max: float = 0
-    wl: array.array = field(default_factory=lambda: array.array('d', [0]*TLCCS_NUM_PIXELS))
-    valid: int = 0
+def _read_only(arr: np.ndarray) -> np.ndarray:
+    arr.flags.writeable = False
+    return arr
 
-@dataclass
-class TLCCS_USER_CAL_PTS:   
-    user_cal_node_cnt: int = 0
-    user_cal_node_pixel: array.array = field(default_factory=lambda: array.array('L', [0]*TLCCS_MAX_NUM_USR_ADJ))
-    user_cal_node_wl: array.array = field(default_factory=lambda: array.array('d', [0]*TLCCS_MAX_NUM_USR_ADJ))
+def _frozen(values, dtype: np.dtype) -> np.ndarray:
+    '''read-only copy of values'''
+    return _read_only(np.array(values, dtype=dtype))
 
-@dataclass
-class TLCCS_ACOR:
-    amplitude_cor: array.array = field(default_factory=lambda: array.array('f', [1.0]*TLCCS_NUM_PIXELS))
-    checksum: int = 0
+class _CalibrationRecord:
+    '''
+    Calibration records hold read-only arrays: they are replaced, never modified
+    in place, so they can be shared between threads and correction plans without copies.
+    '''
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+class TLCCS_WL_CAL(_CalibrationRecord):
+
+    __slots__ = ('poly', 'min', 'max', 'wl', 'valid')
+
+    def __init__(
+            self,
+            poly: Optional[np.ndarray] = None,
+            min: float = 0,
+            max: float = 0,
+            wl: Optional[np.ndarray] = None,
+            valid: int = 0
+        ):
+        self.poly = _frozen(np.zeros((TLCCS_NUM_POLY_POINTS,)) if poly is None else poly, np.float64)
+        self.min = min
+        self.max = max
+        self.wl = _frozen(np.zeros((TLCCS_NUM_PIXELS,)) if wl is None else wl, np.float64)
+        self.valid = valid
+
+class TLCCS_USER_CAL_PTS(_CalibrationRecord):
+
+    __slots__ = ('user_cal_node_cnt', 'user_cal_node_pixel', 'user_cal_node_wl')
+
+    def __init__(
+            self,
+            user_cal_node_cnt: int = 0,
+            user_cal_node_pixel: Optional[np.ndarray] = None,
+            user_cal_node_wl: Optional[np.ndarray] = None
+        ):
+        self.user_cal_node_cnt = user_cal_node_cnt
+        self.user_cal_node_pixel = _frozen(
+            np.zeros((TLCCS_MAX_NUM_USR_ADJ,)) if user_cal_node_pixel is None else user_cal_node_pixel, np.uint32)
+        self.user_cal_node_wl = _frozen(
+            np.zeros((TLCCS_MAX_NUM_USR_ADJ,)) if user_cal_node_wl is None else user_cal_node_wl, np.float64)
+
+class TLCCS_ACOR(_CalibrationRecord):
+
+    __slots__ = ('amplitude_cor', 'checksum')
+
+    def __init__(self, amplitude_cor: Optional[np.ndarray] = None, checksum: int = 0):
+        self.amplitude_cor = _frozen(np.ones((TLCCS_NUM_PIXELS,)) if amplitude_cor is None else amplitude_cor, np.float64)
+        self.checksum = checksum
 
 @dataclass
 class TLCCS_VERSION:
@@ -226,12 +280,15 @@ class TLCCS_DATA:
 
 
 def read_EEPROM_wo_CRC(        
-        dev: usb.core.Device,
+        dev: Union[usb.core.Device, 'EEPROMImage'],
         address: int,
         idx: int,
         length: int
     ) -> array.array:
 
+    if isinstance(dev, EEPROMImage):
+        return dev.read(address, length)
+
     data = array.array('B')
     chunk_address = address
     
@@ -258,7 +315,7 @@ def read_EEPROM_wo_CRC(
 
 
 def read_EEPROM(
-        dev: usb.core.Device,
+        dev: Union[usb.core.Device, 'EEPROMImage'],
         address: int,
         idx: int,
         length: int
@@ -314,12 +371,10 @@ def read_RAM(
 def crc16_block(data: array.array, length: int) -> int:
    
     crc: int = 0xFFFF
-    cnt: int = 0
+    table = CRC16_TABLE
 
-    while length:
-        crc = crc16_update(crc, data[cnt])
-        cnt += 1
-        length -= 1
+    for d in data[:length]:
+        crc = (crc >> 8) ^ table[(crc ^ d) & 0xFF]
 
     return crc
 
@@ -335,19 +390,91 @@ def crc16_update(crc, d: int) -> int:
 
     return crc & 0xFFFF
 
+# crc16_update for every possible byte, starting from a zero crc
+CRC16_TABLE = [crc16_update(0, d) for d in range(256)]
+
+
+class EEPROMImage:
+    '''
+    In-memory copy of (part of) the EEPROM. It can be passed instead of a 
+    device to read_EEPROM and to the functions parsing the calibration, 
+    which then slice the image instead of issuing control transfers.
+    '''
+
+    def __init__(self, image: bytes, start_address: int = 0):
+        self.image = memoryview(bytes(image))
+        self.start_address = start_address
+
+    @classmethod
+    def from_device(
+            cls, 
+            dev: usb.core.Device, 
+            start_address: int = EE_SERIAL_NO, 
+            end_address: int = EE_FREE
+        ) -> 'EEPROMImage':
+        '''read the calibrated EEPROM region in one sequential sweep'''
+
+        image = read_EEPROM_wo_CRC(dev, start_address, 0, end_address - start_address)
+        return cls(image, start_address)
 
-def initialize(dev: usb.core.Device, data: TLCCS_DATA) -> None:
+    @classmethod
+    def from_file(cls, filename: Path, start_address: int = 0) -> 'EEPROMImage':
+        '''load an image saved from dump_eeprom'''
+
+        with open(filename, 'rb') as f:
+            return cls(f.read(), start_address)
+
+    def read(self, address: int, length: int) -> memoryview:
+
+        offset = address - self.start_address
+        if offset < 0 or offset + length > len(self.image):
+            raise ValueError(f'EEPROM range 0x{address:04X}-0x{address+length:04X} is not part of the image')
+        return self.image[offset:offset+length]
+
+
+def initialize(
+        dev: usb.core.Device, 
+        data: TLCCS_DATA,
+        calibration_cache_dir: Optional[Path] = None,
+        serial_number: Optional[str] = None
+    ) -> None:
 
     data.pid = dev.idProduct
     data.vid = dev.idVendor
     data.timeout = TLCCS_TIMEOUT_DEF
     data.cal_mode = TLCCS_CAL_MODE_USER
 
-    set_integration_time(dev, TLCCS_DEF_INT_TIME)
-    get_wavelength_parameters(dev, data)
-    get_dark_current_offset(dev, data)
+    data.int_time = quantize_integration_time(TLCCS_DEF_INT_TIME)
+    set_integration_time(dev, data.int_time)
     get_firmware_revision(dev, data.firmware_version)
     get_hardware_revision(dev, data.hardware_version)
+
+    if calibration_cache_dir is None:
+        get_calibration(dev, data)
+        return
+
+    # only the EEPROM checksums are read when the cached calibration is up to date
+    if serial_number is None:
+        serial_number = dev.serial_number
+    cache_file = calibration_cache_file(calibration_cache_dir, serial_number)
+    checksums = read_calibration_checksums(dev)
+
+    if load_calibration_cache(cache_file, data, checksums):
+        return
+
+    get_calibration(dev, data)
+    try:
+        save_calibration_cache(cache_file, data, checksums)
+    except OSError as e:
+        logger.warning('could not write calibration cache %s: %s', cache_file, e)
+
+def get_calibration(dev: Union[usb.core.Device, EEPROMImage], data: TLCCS_DATA) -> None:
+
+    if not isinstance(dev, EEPROMImage):
+        dev = EEPROMImage.from_device(dev)
+
+    get_wavelength_parameters(dev, data)
+    get_dark_current_offset(dev, data)
     get_amplitude_correction(dev, data) 
 
 def start_single_scan(dev: usb.core.Device):
@@ -370,6 +497,28 @@ def start_continuous_scan(dev: usb.core.Device):
         data_or_wLength=0    
     )
 
+def start_single_scan_ext_trigger(dev: usb.core.Device):
+    '''arm a single scan, started by the next pulse on the external trigger input'''
+
+    dev.ctrl_transfer(
+        bmRequestType=0x40,  
+        bRequest=TLCCS_WCMD_MODUS,         
+        wValue=MODUS_EXTERN_SINGLE_SHOT,
+        wIndex=0x0000,
+        data_or_wLength=0    
+    )
+
+def start_continuous_scan_ext_trigger(dev: usb.core.Device):
+    '''scan on every pulse on the external trigger input'''
+
+    dev.ctrl_transfer(
+        bmRequestType=0x40,  
+        bRequest=TLCCS_WCMD_MODUS,         
+        wValue=MODUS_EXTERN_CONTINUOUS,
+        wIndex=0x0000,
+        data_or_wLength=0    
+    )
+
 def get_device_status(dev: usb.core.Device) -> int:
 
     status_bytes = dev.ctrl_transfer(
@@ -382,135 +531,463 @@ def get_device_status(dev: usb.core.Device) -> int:
     status = struct.unpack('<H', status_bytes)[0]
     return status
 
-def get_scan_data(
-        dev: usb.core.Device, 
-        data: TLCCS_DATA
-    ) -> array.array:
-    
-    raw_scan_bytes = dev.read(0x86, TLCCS_NUM_RAW_PIXELS*UINT16_SZ)
-    raw_scan_data = struct.unpack('<' + 'H'*(len(raw_scan_bytes)//2), raw_scan_bytes)
-    processed_scan_data = array.array('d', [0]*TLCCS_NUM_PIXELS)
+def allocate_raw_buffer() -> array.array:
+    '''buffer for one raw frame, that pyusb can fill in place'''
+    return array.array('H', bytes(TLCCS_NUM_RAW_PIXELS*UINT16_SZ))
+
+def get_raw_scan_data(dev: usb.core.Device, raw: Optional[array.array] = None) -> np.ndarray:
+    '''raw ADC frame (TLCCS_NUM_RAW_PIXELS uint16, dark pixels included), read into raw if given'''
+
+    size = TLCCS_NUM_RAW_PIXELS*UINT16_SZ
+    if raw is None:
+        raw = dev.read(0x86, size)
+        received = len(raw)
+    else:
+        received = dev.read(0x86, raw)
+    # a short transfer would leave the previous frame in raw
+    if received != size:
+        raise usb.core.USBError(f'short scan transfer: {received} of {size} bytes')
+    # zero-copy view on the little-endian ADC words
+    return np.frombuffer(raw, dtype='<u2', count=TLCCS_NUM_RAW_PIXELS)
+
+def decode_scan_data(
+        raw_scan_bytes,
+        out: Optional[np.ndarray] = None,
+        dtype: np.dtype = np.float64
+    ) -> np.ndarray:
+    '''normalized spectrum, written into out (TLCCS_NUM_PIXELS float array) if given'''
+
+    raw_scan_data = np.frombuffer(raw_scan_bytes, dtype='<u2', count=TLCCS_NUM_RAW_PIXELS)
 
     # dark current average
-    dark_com: float = 0.0
-    for i in range(NO_DARK_PIXELS):
-        dark_com += raw_scan_data[(DARK_PIXELS_OFFSET + i)]
-    dark_com /= NO_DARK_PIXELS
-   
+    dark_com: float = raw_scan_data[DARK_PIXELS_OFFSET:DARK_PIXELS_OFFSET+NO_DARK_PIXELS].mean()
+
     # when dark level is too high we assume an overexposure
     if (dark_com > DARK_LEVEL_THRESHOLD_ADC):
         raise Overexposure
 
+    if out is None:
+        out = np.empty((TLCCS_NUM_PIXELS,), dtype=dtype)
+
+    # scalars in the output precision, so that float32 output is computed in float32
+    scalar = out.dtype.type
     norm_com = 1.0 / (MAX_ADC_VALUE - dark_com)
-    for i in range(TLCCS_NUM_PIXELS):
-        processed_scan_data[i] = ((raw_scan_data[SCAN_PIXELS_OFFSET + i]) - dark_com) * norm_com
-    
+    np.subtract(raw_scan_data[SCAN_PIXELS_OFFSET:SCAN_PIXELS_OFFSET+TLCCS_NUM_PIXELS], scalar(dark_com), out=out)
+    out *= scalar(norm_com)
+
+    return out
+
+def process_raw_scan_batch(
+        raw_scans: np.ndarray,
+        amplitude_cor: Optional[np.ndarray] = None,
+        raise_on_overexposure: bool = True
+    ) -> np.ndarray:
+    '''
+    Normalize a (N, TLCCS_NUM_RAW_PIXELS) stack of raw frames into (N, TLCCS_NUM_PIXELS) spectra,
+    optionally multiplied by an amplitude correction. Overexposed frames raise Overexposure,
+    or are set to NaN if raise_on_overexposure is False.
+    '''
+
+    raw_scans = np.asarray(raw_scans)
+    if raw_scans.ndim != 2 or raw_scans.shape[1] != TLCCS_NUM_RAW_PIXELS:
+        raise ValueError(f'expected an (N, {TLCCS_NUM_RAW_PIXELS}) array, got {raw_scans.shape}')
+
+    dark_com = raw_scans[:, DARK_PIXELS_OFFSET:DARK_PIXELS_OFFSET+NO_DARK_PIXELS].mean(axis=1)
+    overexposed = dark_com > DARK_LEVEL_THRESHOLD_ADC
+    if raise_on_overexposure and overexposed.any():
+        raise Overexposure(f'{np.count_nonzero(overexposed)} overexposed frame(s)')
+
+    norm_com = 1.0 / (MAX_ADC_VALUE - dark_com)
+    processed_scans = raw_scans[:, SCAN_PIXELS_OFFSET:SCAN_PIXELS_OFFSET+TLCCS_NUM_PIXELS] - dark_com[:, np.newaxis]
+    processed_scans *= norm_com[:, np.newaxis]
+
+    if amplitude_cor is not None:
+        processed_scans *= np.asarray(amplitude_cor)
+
+    processed_scans[overexposed] = np.nan
+    return processed_scans
+
+def to_array(scan_data: np.ndarray) -> array.array:
+    '''convert processed scan data to the legacy array.array('d') output'''
+
+    res = array.array('d')
+    res.frombytes(np.ascontiguousarray(scan_data, dtype=np.float64).tobytes())
+    return res
+
+def scan_poll_interval(int_time: float) -> float:
+
+    interval = int_time / SCAN_POLLS_PER_INT_TIME
+    return min(max(interval, SCAN_POLL_INTERVAL_MIN), SCAN_POLL_INTERVAL_MAX)
+
+def scan_wait_schedule(
+        int_time: float,
+        scan_start: Optional[float] = None,
+        timeout: Optional[float] = None
+    ) -> Iterator[float]:
+    '''
+    Delays to sleep before each status poll while waiting for a scan: most of the 
+    integration time first (scan_start is a time.monotonic() timestamp, defaults to now), 
+    then a bounded polling rate. Raises ScanTimeout after timeout seconds, never if timeout is None.
+    '''
+
+    now = time.monotonic()
+    if scan_start is None:
+        scan_start = now
+    deadline = None if timeout is None else now + timeout
+
+    wake_up = scan_start + SCAN_SLEEP_FRACTION * int_time
+    if deadline is not None:
+        wake_up = min(wake_up, deadline)
+    yield max(wake_up - now, 0)
+
+    interval = scan_poll_interval(int_time)
+    polls = 1
+    while True:
+        if deadline is not None and time.monotonic() >= deadline:
+            raise ScanTimeout(f'no scan data after {timeout}s ({polls} status polls)')
+        yield interval
+        polls += 1
+
+def wait_for_scan_transfer(
+        dev: usb.core.Device,
+        int_time: float,
+        scan_start: Optional[float] = None,
+        timeout: Optional[float] = None
+    ) -> int:
+    '''wait until a scan is ready for transfer, returns the number of status polls it took'''
+    return poll_scan_transfer(dev, scan_wait_schedule(int_time, scan_start, timeout))
+
+def scan_transfer_ready(dev: usb.core.Device) -> bool:
+    return bool(get_device_status(dev) & TLCCS_STATUS_SCAN_TRANSFER)
+
+def poll_scan_transfer(
+        dev: usb.core.Device,
+        schedule: Iterator[float],
+        stop_event: Optional[threading.Event] = None
+    ) -> Optional[int]:
+    '''
+    poll the status following schedule until a scan is ready for transfer, returns the
+    number of status polls, or None if stop_event was set first
+    '''
+
+    polls = 0
+    for delay in schedule:
+        if stop_event is not None:
+            if stop_event.wait(delay):
+                return None
+        elif delay > 0:
+            time.sleep(delay)
+        polls += 1
+        if scan_transfer_ready(dev):
+            return polls
+
+def get_scan_data(
+        dev: usb.core.Device,
+        data: TLCCS_DATA,
+        as_ndarray: bool = True,
+        raw: Optional[array.array] = None,
+        out: Optional[np.ndarray] = None,
+        dtype: np.dtype = np.float64
+    ) -> Union[np.ndarray, array.array]:
+    '''
+    Read and normalize one scan. With preallocated raw (see allocate_raw_buffer)
+    and out buffers, nothing is allocated per frame.
+    '''
+
+    processed_scan_data = decode_scan_data(get_raw_scan_data(dev, raw), out, dtype)
+
+    if not as_ndarray:
+        return to_array(processed_scan_data)
     return processed_scan_data
 
-def get_scan_data_factory(
-        dev: usb.core.Device, 
-        data: TLCCS_DATA
-    ) -> array.array:
-    
-    scan_data = get_scan_data(dev, data)
-    for i in range(TLCCS_NUM_PIXELS):
-        scan_data[i] *= data.factory_amplitude_cal.amplitude_cor[i]
-    return scan_data
+class CorrectionPlan(NamedTuple):
+    '''
+    precomputed per-pixel amplitude correction for one correction mode and its parameters:
+    the factory correction, or the user correction divided by its minimum over the selected
+    range (pixels outside of it are 0). Applied to spectra already normalized by decode_scan_data.
+    '''
+    mode: int
+    gain: np.ndarray
+    noise_amplification_dB: float = 0.0
+    wavelength_left: float = 0.0
+    wavelength_right: float = 0.0
+    gain32: Optional[np.ndarray] = None
+
+    def gain_for(self, dtype: np.dtype) -> np.ndarray:
+        '''gain in the precision of the spectrum, mixed precision products are several times slower'''
+        if self.gain32 is not None and np.dtype(dtype) == np.float32:
+            return self.gain32
+        return self.gain
+
+def first_index_above(wl: np.ndarray, value: float, inclusive: bool = False) -> int:
+
+    wl = np.asarray(wl)
+    above = wl >= value if inclusive else wl > value
+    idx = int(np.argmax(above))
+    if not above[idx]:
+        raise ValueError(f'{value} nm is outside the wavelength range')
+    return idx
+
+def first_indices_above(wl: np.ndarray, values: np.ndarray, inclusive: bool = False) -> np.ndarray:
+
+    wl = np.asarray(wl)
+    values = np.asarray(values, dtype=np.float64)[..., np.newaxis]
+    above = wl >= values if inclusive else wl > values
+    idx = np.argmax(above, axis=-1)
+    if not np.all(np.take_along_axis(above, idx[..., np.newaxis], axis=-1)):
+        raise ValueError('wavelength outside the wavelength range')
+    return idx
+
+def _correction_plan(mode: int, gain: np.ndarray, **kwargs) -> CorrectionPlan:
+    return CorrectionPlan(
+        mode,
+        _read_only(gain),
+        gain32 = _read_only(gain.astype(np.float32)),
+        **kwargs
+    )
 
-def get_scan_data_corrected_range(
-        dev: usb.core.Device, 
-        data: TLCCS_DATA, 
-        min_wl: float,
-        max_wl: float
-    ) -> Tuple[array.array, float]:
+def correction_plan_factory(data: TLCCS_DATA) -> CorrectionPlan:
+    # the amplitude correction is already read-only, the plan shares it
+    return _correction_plan(CORRECTION_MODE_FACTORY, data.factory_amplitude_cal.amplitude_cor)
 
-    idx_min: int = next((i for i, val in enumerate(data.factory_wavelength_cal.wl) if val > min_wl))
-    idx_max: int = next((i for i, val in enumerate(data.factory_wavelength_cal.wl) if val > max_wl))
-    amplitude_cor: array.array = data.user_amplitude_cal.amplitude_cor[idx_min:idx_max]
-    noise_amplification_mult: float = max(amplitude_cor)/min(amplitude_cor)
+def correction_plan_range(data: TLCCS_DATA, min_wl: float, max_wl: float) -> CorrectionPlan:
+
+    idx_min = first_index_above(data.factory_wavelength_cal.wl, min_wl)
+    idx_max = first_index_above(data.factory_wavelength_cal.wl, max_wl)
+    amplitude_cor = data.user_amplitude_cal.amplitude_cor
+    min_correction = amplitude_cor[idx_min:idx_max].min()
+    noise_amplification_mult: float = amplitude_cor[idx_min:idx_max].max()/min_correction
     noise_amplification_dB: float = 10*math.log10(noise_amplification_mult)
-    
-    scan_data = get_scan_data(dev, data)
-    for i in range(TLCCS_NUM_PIXELS):
-        if i < idx_min or i > idx_max:
-            scan_data[i] = 0
-        else:
-            scan_data[i] *= data.user_amplitude_cal.amplitude_cor[i] / min(amplitude_cor)
-    return scan_data, noise_amplification_dB
 
+    gain = amplitude_cor / min_correction
+    gain[:idx_min] = 0
+    gain[idx_max+1:] = 0
+    return _correction_plan(
+        CORRECTION_MODE_RANGE,
+        gain,
+        noise_amplification_dB = noise_amplification_dB
+    )
+
+class RangeMinMaxIndex:
+    '''
+    Sparse tables answering min/max queries over any inclusive index range [left, right]
+    in constant time. Queries accept scalars or arrays of indices.
+    '''
+
+    def __init__(self, arr: np.ndarray):
+
+        values = np.asarray(arr, dtype=np.float64)
+        n = len(values)
+        num_levels = max(n.bit_length(), 1)
+
+        # level k holds min/max over [i, i + 2**k - 1], padded past the end
+        self._min = np.full((num_levels, n), np.inf)
+        self._max = np.full((num_levels, n), -np.inf)
+        self._min[0] = values
+        self._max[0] = values
+        for k in range(1, num_levels):
+            half = 1 << (k-1)
+            span = n - (1 << k) + 1
+            self._min[k, :span] = np.minimum(self._min[k-1, :span], self._min[k-1, half:half+span])
+            self._max[k, :span] = np.maximum(self._max[k-1, :span], self._max[k-1, half:half+span])
+
+        # floor(log2(length)) for every possible range length
+        self._log2 = np.zeros((n+1,), dtype=np.intp)
+        self._log2[2:] = np.floor(np.log2(np.arange(2, n+1))).astype(np.intp)
+
+        self.values = values
+        self.n = n
+
+    def _levels(self, left, right):
+        left = np.asarray(left, dtype=np.intp)
+        right = np.asarray(right, dtype=np.intp)
+        k = self._log2[right - left + 1]
+        return k, left, right - (1 << k) + 1
+
+    def min(self, left, right):
+        k, a, b = self._levels(left, right)
+        return np.minimum(self._min[k, a], self._min[k, b])
+
+    def max(self, left, right):
+        k, a, b = self._levels(left, right)
+        return np.maximum(self._max[k, a], self._max[k, b])
+
+    def ratio(self, left, right):
+        return self.max(left, right) / self.min(left, right)
+
+
+def _largest_valid_step(valid, max_step: np.ndarray) -> np.ndarray:
+    # binary search for the largest step in [0, max_step] such that valid(step),
+    # valid being monotonic (true up to some step, false afterwards)
+
+    lo = np.zeros_like(max_step)
+    hi = max_step.copy()
+    while np.any(lo < hi):
+        mid = (lo + hi + 1) // 2
+        ok = valid(mid)
+        lo = np.where(ok, mid, lo)
+        hi = np.where(ok, hi, mid - 1)
+    return lo
+
+def find_centered_range_batch(
+        index: RangeMinMaxIndex,
+        centers: np.ndarray,
+        thresholds: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    Vectorized find_centered_range for many (center, threshold) pairs (broadcast together).
+    Returns left, right, min_val, max_val arrays.
+
+    Since max/min only grows with the range, the pixel-by-pixel expansion of
+    find_centered_range reduces to three binary searches: symmetric expansion
+    as far as possible, then left-only, then right-only.
+    '''
+
+    centers, thresholds = np.broadcast_arrays(
+        np.asarray(centers, dtype=np.intp),
+        np.asarray(thresholds, dtype=np.float64)
+    )
+    last = index.n - 1
+
+    # 1. symmetric expansion
+    step = _largest_valid_step(
+        lambda k: index.ratio(centers - k, centers + k) <= thresholds,
+        np.minimum(centers, last - centers)
+    )
+    left = centers - step
+    right = centers + step
 
-def find_centered_range(arr: array.array, center: int, threshold: float) -> Tuple[int, int, float, float]:
+    # 2. left-only expansion
+    step = _largest_valid_step(
+        lambda k: index.ratio(left - k, right) <= thresholds,
+        left
+    )
+    left = left - step
 
-    n = len(arr)
-    left = right = center
-    min_val = max_val = arr[center]
+    # 3. right-only expansion
+    step = _largest_valid_step(
+        lambda k: index.ratio(left, right + k) <= thresholds,
+        last - right
+    )
+    right = right + step
 
-    while True:
-        expanded = False
-
-        # 1. Try symmetric expansion first
-        if left > 0 and right < n - 1:
-            new_left, new_right = left - 1, right + 1
-            new_min = min(min_val, arr[new_left], arr[new_right])
-            new_max = max(max_val, arr[new_left], arr[new_right])
-            if new_max / new_min <= threshold:
-                left, right = new_left, new_right
-                min_val, max_val = new_min, new_max
-                expanded = True
-
-        # 2. If symmetric fails (or one side blocked), try one-sided
-        if not expanded:
-            # try left-only
-            if left > 0:
-                new_left = left - 1
-                new_min = min(min_val, arr[new_left])
-                new_max = max(max_val, arr[new_left])
-                if new_max / new_min <= threshold:
-                    left = new_left
-                    min_val, max_val = new_min, new_max
-                    expanded = True
-
-            # try right-only
-            if not expanded and right < n - 1:
-                new_right = right + 1
-                new_min = min(min_val, arr[new_right])
-                new_max = max(max_val, arr[new_right])
-                if new_max / new_min <= threshold:
-                    right = new_right
-                    min_val, max_val = new_min, new_max
-                    expanded = True
-
-        if not expanded:
-            break
+    return left, right, index.min(left, right), index.max(left, right)
 
-    return left, right, min_val, max_val
+def find_centered_range(
+        arr: np.ndarray,
+        center: int,
+        threshold: float,
+        index: Optional[RangeMinMaxIndex] = None
+    ) -> Tuple[int, int, float, float]:
 
-def get_scan_data_corrected_noise(
-        dev: usb.core.Device, 
-        data: TLCCS_DATA, 
+    if index is None:
+        index = RangeMinMaxIndex(arr)
+
+    left, right, min_val, max_val = find_centered_range_batch(index, center, threshold)
+    return int(left), int(right), float(min_val), float(max_val)
+
+def correction_plan_noise(
+        data: TLCCS_DATA,
         center_wl: float,
-        noise_amplification_dB: float
-    ) -> Tuple[array.array, float, float]:
+        noise_amplification_dB: float,
+        index: Optional[RangeMinMaxIndex] = None
+    ) -> CorrectionPlan:
+    '''index: RangeMinMaxIndex of the user amplitude correction, built here if not given'''
 
     noise_multiplier = 10**(noise_amplification_dB/10)
-    idx_center: int = next((i for i, val in enumerate(data.factory_wavelength_cal.wl) if val >= center_wl)) 
+    idx_center = first_index_above(data.factory_wavelength_cal.wl, center_wl, inclusive=True)
 
     idx_left, idx_right, min_correction, max_correction = find_centered_range(
-        arr = data.user_amplitude_cal.amplitude_cor, 
-        center = idx_center, 
-        threshold = noise_multiplier
+        arr = data.user_amplitude_cal.amplitude_cor,
+        center = idx_center,
+        threshold = noise_multiplier,
+        index = index
     )
-    wavelength_left = data.factory_wavelength_cal.wl[idx_left]
-    wavelength_right = data.factory_wavelength_cal.wl[idx_right]
-
-    scan_data = get_scan_data(dev, data)
-    for i in range(TLCCS_NUM_PIXELS):
-        if i < idx_left or i > idx_right:
-            scan_data[i] = 0
-        scan_data[i] *= data.user_amplitude_cal.amplitude_cor[i] / min_correction
-    
-    return scan_data, wavelength_left, wavelength_right
-    
+
+    gain = data.user_amplitude_cal.amplitude_cor / min_correction
+    gain[:idx_left] = 0
+    gain[idx_right+1:] = 0
+    return _correction_plan(
+        CORRECTION_MODE_NOISE,
+        gain,
+        wavelength_left = data.factory_wavelength_cal.wl[idx_left],
+        wavelength_right = data.factory_wavelength_cal.wl[idx_right]
+    )
+
+CORRECTION_PLAN_BUILDERS = {
+    CORRECTION_MODE_FACTORY: correction_plan_factory,
+    CORRECTION_MODE_RANGE: correction_plan_range,
+    CORRECTION_MODE_NOISE: correction_plan_noise,
+}
+
+def make_correction_plan(data: TLCCS_DATA, mode: int, *params: float) -> CorrectionPlan:
+    return CORRECTION_PLAN_BUILDERS[mode](data, *params)
+
+def get_scan_data_corrected(
+        dev: usb.core.Device,
+        data: TLCCS_DATA,
+        plan: CorrectionPlan,
+        as_ndarray: bool = True,
+        raw: Optional[array.array] = None,
+        out: Optional[np.ndarray] = None,
+        dtype: np.dtype = np.float64
+    ) -> Union[np.ndarray, array.array]:
+
+    scan_data = get_scan_data(dev, data, raw=raw, out=out, dtype=dtype)
+    scan_data *= plan.gain_for(scan_data.dtype)
+
+    if not as_ndarray:
+        return to_array(scan_data)
+    return scan_data
+
+def get_scan_data_factory(
+        dev: usb.core.Device,
+        data: TLCCS_DATA,
+        as_ndarray: bool = True,
+        plan: Optional[CorrectionPlan] = None,
+        raw: Optional[array.array] = None,
+        out: Optional[np.ndarray] = None,
+        dtype: np.dtype = np.float64
+    ) -> Union[np.ndarray, array.array]:
+
+    if plan is None:
+        plan = correction_plan_factory(data)
+    return get_scan_data_corrected(dev, data, plan, as_ndarray, raw, out, dtype)
+
+def get_scan_data_corrected_range(
+        dev: usb.core.Device,
+        data: TLCCS_DATA,
+        min_wl: float,
+        max_wl: float,
+        as_ndarray: bool = True,
+        plan: Optional[CorrectionPlan] = None,
+        raw: Optional[array.array] = None,
+        out: Optional[np.ndarray] = None,
+        dtype: np.dtype = np.float64
+    ) -> Tuple[Union[np.ndarray, array.array], float]:
+
+    if plan is None:
+        plan = correction_plan_range(data, min_wl, max_wl)
+    scan_data = get_scan_data_corrected(dev, data, plan, as_ndarray, raw, out, dtype)
+    return scan_data, plan.noise_amplification_dB
+
+def get_scan_data_corrected_noise(
+        dev: usb.core.Device,
+        data: TLCCS_DATA,
+        center_wl: float,
+        noise_amplification_dB: float,
+        as_ndarray: bool = True,
+        plan: Optional[CorrectionPlan] = None,
+        raw: Optional[array.array] = None,
+        out: Optional[np.ndarray] = None,
+        dtype: np.dtype = np.float64
+    ) -> Tuple[Union[np.ndarray, array.array], float, float]:
+
+    if plan is None:
+        plan = correction_plan_noise(data, center_wl, noise_amplification_dB)
+    scan_data = get_scan_data_corrected(dev, data, plan, as_ndarray, raw, out, dtype)
+    return scan_data, plan.wavelength_left, plan.wavelength_right
+
 def set_integration_time(dev: usb.core.Device, time: float):
     
     time_data = encode_integration_time(time)
@@ -534,7 +1011,7 @@ def get_integration_time(dev: usb.core.Device) -> float:
     )
     return decode_integration_time(time_bytes)
 
-def get_wavelength(data: TLCCS_DATA, factory_or_user: int = TLCCS_CAL_DATA_SET_FACTORY) -> array.array:
+def get_wavelength(data: TLCCS_DATA, factory_or_user: int = TLCCS_CAL_DATA_SET_FACTORY) -> np.ndarray:
     
     if factory_or_user == TLCCS_CAL_DATA_SET_FACTORY:
         return data.factory_wavelength_cal.wl
@@ -550,7 +1027,7 @@ def get_wavelength(data: TLCCS_DATA, factory_or_user: int = TLCCS_CAL_DATA_SET_F
 def get_wavelength_parameters(dev: usb.core.Device, data: TLCCS_DATA)  -> None:
 
     data.factory_wavelength_cal.valid = 0
-    read_factory_poly(dev, data.factory_wavelength_cal.poly)
+    data.factory_wavelength_cal.poly = read_factory_poly(dev)
     poly_to_wavelength_array(data.factory_wavelength_cal)
 
     data.user_wavelength_cal.valid = 0
@@ -617,16 +1094,10 @@ def get_amplitude_correction_array(
         idx = 0, 
         length = EE_LENGTH_ACOR
     )
-    amplitude_cor_data = struct.unpack('<' + 'f'*TLCCS_NUM_PIXELS , amplitude_cor_bytes)
-    for i, a in enumerate(amplitude_cor_data):
-        amplitude_cor_cal.amplitude_cor[i] = a
-
-    for i in range(TLCCS_NUM_PIXELS):
-        if amplitude_cor_cal.amplitude_cor[i] < TLCCS_AMP_CORR_FACT_MIN:
-            amplitude_cor_cal.amplitude_cor[i] = TLCCS_AMP_CORR_FACT_MIN
-
-        if amplitude_cor_cal.amplitude_cor[i] > TLCCS_AMP_CORR_FACT_MAX:
-            amplitude_cor_cal.amplitude_cor[i] = TLCCS_AMP_CORR_FACT_MAX
+    amplitude_cor = np.frombuffer(amplitude_cor_bytes, dtype='<f4', count=TLCCS_NUM_PIXELS)
+    # clamped in single precision as stored, then widened for the correction plans
+    amplitude_cor = np.clip(amplitude_cor, TLCCS_AMP_CORR_FACT_MIN, TLCCS_AMP_CORR_FACT_MAX)
+    amplitude_cor_cal.amplitude_cor = _frozen(amplitude_cor, np.float64)
 
 
 def get_amplitude_correction(dev: usb.core.Device, data: TLCCS_DATA) -> None:
@@ -635,7 +1106,102 @@ def get_amplitude_correction(dev: usb.core.Device, data: TLCCS_DATA) -> None:
     get_amplitude_correction_array(dev, data.user_amplitude_cal, EE_ACOR_USER)
 
 
-def read_factory_poly(dev: usb.core.Device, poly: array.array) -> None:
+#===========================================================================
+#   On-disk calibration cache
+#===========================================================================
+
+CALIBRATION_CACHE_VERSION = 1
+
+# (address, length) of every checksummed EEPROM field parsed by initialize
+CALIBRATION_CHECKSUM_FIELDS = (
+    (EE_FACT_CAL_COEF_DATA, EE_LENGTH_FACT_CAL_COEF_DATA),
+    (EE_USER_CAL_POINTS_CNT, EE_LENGTH_USER_CAL_POINTS_CNT),
+    (EE_USER_CAL_POINTS_DATA, EE_LENGTH_USER_CAL_POINTS_DATA),
+    (EE_EVEN_OFFSET_MAX, EE_LENGTH_OFFSET_MAX),
+    (EE_ODD_OFFSET_MAX, EE_LENGTH_OFFSET_MAX),
+    (EE_ACOR_FACTORY, EE_LENGTH_ACOR),
+    (EE_ACOR_USER, EE_LENGTH_ACOR),
+)
+
+def read_calibration_checksums(dev: usb.core.Device) -> np.ndarray:
+    '''checksums stored on the EEPROM for every calibration field, one control transfer each'''
+
+    checksums = np.zeros((len(CALIBRATION_CHECKSUM_FIELDS),), dtype=np.uint16)
+    for i, (address, length) in enumerate(CALIBRATION_CHECKSUM_FIELDS):
+        checksum_bytes = read_EEPROM_wo_CRC(dev, address+length, 0, UINT16_SZ)
+        checksums[i] = struct.unpack('<H', checksum_bytes)[0]
+    return checksums
+
+def calibration_cache_file(cache_dir: Path, serial_number: str) -> Path:
+    safe_serial = ''.join(c if c.isalnum() else '_' for c in serial_number)
+    return Path(cache_dir) / f'{safe_serial}.npz'
+
+def save_calibration_cache(filename: Path, data: TLCCS_DATA, checksums: np.ndarray) -> None:
+
+    filename = Path(filename)
+    filename.parent.mkdir(parents=True, exist_ok=True)
+
+    # write to a temporary file first so that a crash never leaves a truncated cache
+    tmp_filename = filename.with_suffix('.tmp')
+    with open(tmp_filename, 'wb') as f:
+        np.savez(
+            f,
+            version = CALIBRATION_CACHE_VERSION,
+            pid = data.pid,
+            checksums = checksums,
+            factory_poly = np.asarray(data.factory_wavelength_cal.poly),
+            factory_wl = np.asarray(data.factory_wavelength_cal.wl),
+            factory_range = [data.factory_wavelength_cal.min, data.factory_wavelength_cal.max],
+            factory_valid = data.factory_wavelength_cal.valid,
+            user_poly = np.asarray(data.user_wavelength_cal.poly),
+            user_wl = np.asarray(data.user_wavelength_cal.wl),
+            user_range = [data.user_wavelength_cal.min, data.user_wavelength_cal.max],
+            user_valid = data.user_wavelength_cal.valid,
+            user_cal_node_cnt = data.user_points.user_cal_node_cnt,
+            user_cal_node_pixel = np.asarray(data.user_points.user_cal_node_pixel),
+            user_cal_node_wl = np.asarray(data.user_points.user_cal_node_wl),
+            offset_max = [data.even_offset_max, data.odd_offset_max],
+            factory_acor = np.asarray(data.factory_amplitude_cal.amplitude_cor),
+            user_acor = np.asarray(data.user_amplitude_cal.amplitude_cor),
+        )
+    tmp_filename.replace(filename)
+
+def load_calibration_cache(filename: Path, data: TLCCS_DATA, checksums: np.ndarray) -> bool:
+    '''fill data from the cache file, returns False if the file is missing or stale'''
+
+    try:
+        with np.load(filename) as cache:
+            if (
+                int(cache['version']) != CALIBRATION_CACHE_VERSION
+                or int(cache['pid']) != data.pid
+                or not np.array_equal(cache['checksums'], checksums)
+            ):
+                return False
+
+            data.factory_wavelength_cal.poly = _frozen(cache['factory_poly'], np.float64)
+            data.factory_wavelength_cal.wl = _frozen(cache['factory_wl'], np.float64)
+            data.factory_wavelength_cal.min, data.factory_wavelength_cal.max = cache['factory_range'].tolist()
+            data.factory_wavelength_cal.valid = int(cache['factory_valid'])
+
+            data.user_wavelength_cal.poly = _frozen(cache['user_poly'], np.float64)
+            data.user_wavelength_cal.wl = _frozen(cache['user_wl'], np.float64)
+            data.user_wavelength_cal.min, data.user_wavelength_cal.max = cache['user_range'].tolist()
+            data.user_wavelength_cal.valid = int(cache['user_valid'])
+
+            data.user_points.user_cal_node_cnt = int(cache['user_cal_node_cnt'])
+            data.user_points.user_cal_node_pixel = _frozen(cache['user_cal_node_pixel'], np.uint32)
+            data.user_points.user_cal_node_wl = _frozen(cache['user_cal_node_wl'], np.float64)
+
+            data.even_offset_max, data.odd_offset_max = cache['offset_max'].tolist()
+            data.factory_amplitude_cal.amplitude_cor = _frozen(cache['factory_acor'], np.float64)
+            data.user_amplitude_cal.amplitude_cor = _frozen(cache['user_acor'], np.float64)
+
+    except (OSError, KeyError, ValueError):
+        return False
+
+    return True
+
+def read_factory_poly(dev: usb.core.Device) -> np.ndarray:
 
     data = read_EEPROM(
         dev, 
@@ -643,9 +1209,7 @@ def read_factory_poly(dev: usb.core.Device, poly: array.array) -> None:
         idx = 0, 
         length = EE_LENGTH_FACT_CAL_COEF_DATA
     )
-    poly_coeff = struct.unpack('<' + 'd'*TLCCS_NUM_POLY_POINTS, data)
-    for i, coeff in enumerate(poly_coeff):
-        poly[i] = coeff
+    return _frozen(np.frombuffer(data, dtype='<f8', count=TLCCS_NUM_POLY_POINTS), np.float64)
 
 def read_user_points(dev: usb.core.Device, user_points: TLCCS_USER_CAL_PTS) -> None:
     
@@ -667,18 +1231,15 @@ def read_user_points(dev: usb.core.Device, user_points: TLCCS_USER_CAL_PTS) -> N
         length = EE_LENGTH_USER_CAL_POINTS_DATA
     )
 
-    user_points.user_cal_node_cnt = cnt
+    # pixels (uint32) then wavelengths (float64), TLCCS_MAX_NUM_USR_ADJ slots each, cnt used
+    pixels = np.zeros((TLCCS_MAX_NUM_USR_ADJ,), dtype=np.uint32)
+    pixels[:cnt] = np.frombuffer(point_data, dtype='<u4', count=cnt)
+    wavelengths = np.zeros((TLCCS_MAX_NUM_USR_ADJ,), dtype=np.float64)
+    wavelengths[:cnt] = np.frombuffer(point_data, dtype='<f8', count=cnt, offset=TLCCS_MAX_NUM_USR_ADJ*UINT32_SZ)
 
-    n_bytes_px = cnt*UINT32_SZ
-    pixels = struct.unpack('<'+'L'*cnt, point_data[:n_bytes_px])
-    for i, px in enumerate(pixels):
-        user_points.user_cal_node_pixel[i] = px
-
-    n_bytes_wl = cnt*REAL64_SZ
-    wl_start = TLCCS_MAX_NUM_USR_ADJ*UINT32_SZ  
-    wavelengths = struct.unpack('<'+'d'*cnt, point_data[wl_start:wl_start+n_bytes_wl])
-    for i, wl in enumerate(wavelengths):
-        user_points.user_cal_node_wl[i] = wl
+    user_points.user_cal_node_cnt = cnt
+    user_points.user_cal_node_pixel = _read_only(pixels)
+    user_points.user_cal_node_wl = _read_only(wavelengths)
 
 
 def nodes_to_poly(user_points: TLCCS_USER_CAL_PTS, user_wavelength_cal: TLCCS_WL_CAL):
@@ -688,40 +1249,47 @@ def nodes_to_poly(user_points: TLCCS_USER_CAL_PTS, user_wavelength_cal: TLCCS_WL
         user_points.user_cal_node_wl[:user_points.user_cal_node_cnt], 
         deg = 3
     )[::-1]
+    user_wavelength_cal.poly = _frozen(polynomial, np.float64)
+
+WAVELENGTH_CACHE_SIZE = 32
+_wavelength_cache: OrderedDict = OrderedDict()
+_wavelength_cache_lock = threading.Lock() # devices are opened from several threads
+_PIXEL_INDEX = np.arange(TLCCS_NUM_PIXELS, dtype=np.float64)
+
+def wavelength_array(poly: np.ndarray) -> np.ndarray:
+    '''
+    Wavelength of every pixel for a calibration polynomial, as a read-only array
+    shared by all callers with the same polynomial (LRU cache). Raises InvalidUserData
+    if the axis is not strictly monotonic.
+    '''
+
+    key = tuple(float(p) for p in poly)
+    with _wavelength_cache_lock:
+        wl = _wavelength_cache.get(key)
+        if wl is not None:
+            _wavelength_cache.move_to_end(key)
+            return wl
+
+    x = _PIXEL_INDEX
+    wl = key[0] + x * (key[1] + x * (key[2] + x * key[3]))
+    step = np.diff(wl)
+    if not (np.all(step > 0) or np.all(step < 0)):
+        raise InvalidUserData
 
-    for i, p in enumerate(polynomial):
-        user_wavelength_cal.poly[i] = p 
+    wl = _read_only(wl)
+    with _wavelength_cache_lock:
+        # another thread may have computed it meanwhile, keep a single shared array
+        wl = _wavelength_cache.setdefault(key, wl)
+        _wavelength_cache.move_to_end(key)
+        if len(_wavelength_cache) > WAVELENGTH_CACHE_SIZE:
+            _wavelength_cache.popitem(last=False)
+    return wl
 
 def poly_to_wavelength_array(cal: TLCCS_WL_CAL) -> None:
 
-    direction_flag: int = 0
-
-    for i in range(TLCCS_NUM_PIXELS):
-        cal.wl[i] = cal.poly[0] + i * (cal.poly[1] + i * (cal.poly[2] + i * cal.poly[3]))
-    
-    if (cal.wl[0] < cal.wl[1]):
-        direction_flag = 1
-    elif (cal.wl[0] > cal.wl[1]):
-        direction_flag = -1
-    else:
-        raise InvalidUserData
-    
-    d = cal.wl[0]
-    for i in range(1,TLCCS_NUM_PIXELS):
-        if (direction_flag == 1):
-            if(cal.wl[i] <= d): 
-                raise InvalidUserData
-        else:
-            if(cal.wl[i] <= d):
-                raise InvalidUserData
-        d = cal.wl[i]
-
-    if (direction_flag == 1):
-        cal.min = cal.poly[0]
-        cal.max = cal.wl[TLCCS_NUM_PIXELS - 1]
-    else:
-        cal.min = cal.wl[TLCCS_NUM_PIXELS - 1]
-        cal.max = cal.poly[0]
+    cal.wl = wavelength_array(cal.poly)
+    first, last = float(cal.wl[0]), float(cal.wl[-1])
+    cal.min, cal.max = min(first, last), max(first, last)
 
 
 def decode_integration_time(data: array.array, mask: int = 0x0FFF) -> float:
@@ -731,6 +1299,20 @@ def decode_integration_time(data: array.array, mask: int = 0x0FFF) -> float:
     return integration_time
 
 
+def quantize_integration_time(time_sec: float) -> float:
+    '''
+    integration time actually applied by the device for a requested time, as a fixed point:
+    encoding truncates to whole microseconds, so a decoded time does not always encode to
+    the same setting again, the result does
+    '''
+
+    for _ in range(4):
+        quantized = decode_integration_time(encode_integration_time(time_sec))
+        if quantized == time_sec:
+            break
+        time_sec = quantized
+    return quantized
+
 def encode_integration_time(time_sec: float) -> array.array:
 
     if not (TLCCS_MIN_INT_TIME<=time_sec<=TLCCS_MAX_INT_TIME):
@@ -769,64 +1351,199 @@ def encode_integration_time(time_sec: float) -> array.array:
 
     return data
 
-def parse_spt(filename):
+#===========================================================================
+#   Firmware upload
+#===========================================================================
 
-    records = []
-    with open(filename, "rb") as f:
-        data = f.read()
+EZUSB_CPUCS = 0xE600 # CPU control register, written to hold/release the 8051
+EZUSB_MAX_TRANSFER = 1023 # largest control transfer accepted by the loader (same as fxload)
 
-    offset = 0
-    while offset < len(data):
-        # Look for CSPT magic
-        if data[offset:offset+4] != b'CSPT':
-            offset += 1
-            continue
+FIRMWARE_CACHE_MAGIC = b'CSPTFW01'
+FIRMWARE_RECORD_HEADER = struct.Struct('<BHHH') # bRequest, wValue, wIndex, wLength
+
+class FirmwareRecord(NamedTuple):
+    bRequest: int
+    wValue: int
+    wIndex: int
+    data: bytes
+
+    @property
+    def wLength(self) -> int:
+        return len(self.data)
+
+class FirmwareUploadError(Exception):
+
+    def __init__(self, index: int, record: FirmwareRecord, cause: BaseException):
+        self.index = index
+        self.record = record
+        self.cause = cause
+        super().__init__(
+            f'firmware record {index} (bRequest 0x{record.bRequest:02x}, '
+            f'address 0x{record.wValue:04x}, {record.wLength} bytes) failed: {cause}'
+        )
+
+# parsed firmware images, keyed by the sha256 of the .spt file
+_firmware_cache: Dict[str, List[FirmwareRecord]] = {}
+
+def parse_spt_bytes(data: bytes) -> List[FirmwareRecord]:
+
+    records = []
+    offset = data.find(b'CSPT')
+    while offset >= 0:
 
         # Read block length (little endian 4-byte at offset 4)
         block_len = struct.unpack_from("<I", data, offset+4)[0]
 
         # Sanity check
         if offset + block_len > len(data):
-            print(f"Warning: block at {offset} exceeds file length")
+            logger.warning('block at %d exceeds file length', offset)
             break
-
-        block = data[offset:offset+block_len]
+        if block_len < 32:
+            logger.warning('block at %d is too short (%d bytes)', offset, block_len)
+            offset = data.find(b'CSPT', offset+4)
+            continue
 
         # Extract fields based on known mapping
-        bRequest = block[16]
-        wValue = struct.unpack_from("<H", block, 18)[0]
-        wIndex = struct.unpack_from("<H", block, 20)[0]
-        wLength = struct.unpack_from("<H", block, 28)[0]
-        payload = block[32:32+wLength]
-
-        record = {
-            "bRequest": bRequest,
-            "wValue": wValue,
-            "wIndex": wIndex,
-            "wLength": wLength,
-            "data": payload
-        }
-        records.append(record)
-
-        offset += block_len
+        bRequest = data[offset+16]
+        wValue, wIndex = struct.unpack_from("<HH", data, offset+18)
+        wLength = struct.unpack_from("<H", data, offset+28)[0]
+        records.append(FirmwareRecord(
+            bRequest = bRequest,
+            wValue = wValue,
+            wIndex = wIndex,
+            data = data[offset+32:offset+32+wLength]
+        ))
+
+        offset = data.find(b'CSPT', offset+block_len)
 
     return records
 
-def upload_firmware(dev: usb.core.Device, records):
+def pack_firmware(records: List[FirmwareRecord]) -> bytes:
+    '''compact binary form: magic, then a (bRequest, wValue, wIndex, wLength) header and the payload per record'''
+
+    chunks = [FIRMWARE_CACHE_MAGIC]
+    for rec in records:
+        chunks.append(FIRMWARE_RECORD_HEADER.pack(rec.bRequest, rec.wValue, rec.wIndex, rec.wLength))
+        chunks.append(rec.data)
+    return b''.join(chunks)
+
+def unpack_firmware(packed: bytes) -> List[FirmwareRecord]:
 
+    if packed[:len(FIRMWARE_CACHE_MAGIC)] != FIRMWARE_CACHE_MAGIC:
+        raise ValueError('not a packed firmware image')
+
+    records = []
+    offset = len(FIRMWARE_CACHE_MAGIC)
+    while offset < len(packed):
+        bRequest, wValue, wIndex, wLength = FIRMWARE_RECORD_HEADER.unpack_from(packed, offset)
+        offset += FIRMWARE_RECORD_HEADER.size
+        if offset + wLength > len(packed):
+            raise ValueError('truncated firmware image')
+        records.append(FirmwareRecord(bRequest, wValue, wIndex, packed[offset:offset+wLength]))
+        offset += wLength
+    return records
+
+def parse_spt(filename, cache_dir: Optional[Path] = None) -> List[FirmwareRecord]:
+    '''
+    Parse a .spt firmware file. Parsed images are kept in memory for the lifetime
+    of the process and, if cache_dir is given, stored there in packed form.
+    '''
+
+    with open(filename, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    records = _firmware_cache.get(digest)
+    if records is not None:
+        return records
+
+    cache_file = None if cache_dir is None else Path(cache_dir) / f'{digest}.fw'
+    if cache_file is not None:
+        try:
+            records = unpack_firmware(cache_file.read_bytes())
+        except (OSError, ValueError, struct.error):
+            records = None
+
+    if records is None:
+        records = parse_spt_bytes(data)
+        if cache_file is not None:
+            try:
+                cache_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp_file = cache_file.with_suffix('.tmp')
+                tmp_file.write_bytes(pack_firmware(records))
+                tmp_file.replace(cache_file)
+            except OSError as e:
+                logger.warning('could not write firmware cache %s: %s', cache_file, e)
+
+    _firmware_cache[digest] = records
+    return records
+
+def _touches_cpucs(rec: FirmwareRecord) -> bool:
+    return rec.wValue <= EZUSB_CPUCS < rec.wValue + rec.wLength
+
+def coalesce_firmware_records(
+        records: List[FirmwareRecord],
+        max_transfer: int = EZUSB_MAX_TRANSFER
+    ) -> List[FirmwareRecord]:
+    '''
+    Merge consecutive records that write contiguous addresses with the same bRequest
+    and wIndex, up to max_transfer bytes. Writes to CPUCS are never merged, so the
+    hold/release sequence is sent exactly as in the file.
+    '''
+
+    merged = []
+    pending: Optional[FirmwareRecord] = None
+    chunks: List[bytes] = []
+    length = 0
+
+    for rec in records:
+
+        if (
+            pending is not None
+            and rec.bRequest == pending.bRequest
+            and rec.wIndex == pending.wIndex
+            and rec.wValue == pending.wValue + length
+            and length + rec.wLength <= max_transfer
+            and not _touches_cpucs(pending)
+            and not _touches_cpucs(rec)
+        ):
+            chunks.append(rec.data)
+            length += rec.wLength
+            continue
+
+        if pending is not None:
+            merged.append(pending._replace(data = b''.join(chunks)))
+        pending, chunks, length = rec, [rec.data], rec.wLength
+
+    if pending is not None:
+        merged.append(pending._replace(data = b''.join(chunks)))
+
+    return merged
+
+def upload_firmware(
+        dev: usb.core.Device,
+        records: List[FirmwareRecord],
+        coalesce: bool = True
+    ) -> int:
+    '''send the firmware records, returns the number of control transfers. Raises FirmwareUploadError'''
+
+    if coalesce:
+        records = coalesce_firmware_records(records)
+
+    bmRequestType = 0x40
     for i, rec in enumerate(records):
-        bmRequestType = 0x40  
         try:
             dev.ctrl_transfer(
                 bmRequestType,
-                rec["bRequest"],
-                rec["wValue"],
-                rec["wIndex"],
-                rec["data"]
+                rec.bRequest,
+                rec.wValue,
+                rec.wIndex,
+                rec.data
             )
         except usb.core.USBError as e:
-            print(f"Error sending block {i+1}: {e}")
-            break
+            raise FirmwareUploadError(i, rec, e) from e
+
+    return len(records)
 
 def dump_eeprom(dev: usb.core.Device) -> array.array:
 
@@ -892,51 +1609,91 @@ def reset_device(dev: usb.core.Device):
 
 
 def wait_for_device(
-        idVendor: int, 
-        idProduct: int, 
-        port_numbers: Tuple, 
+        idVendor: int,
+        idProduct: int,
+        port_numbers: Tuple,
         timeout: float = DEFAULT_RENUMERATION_TIMEOUT
     ) -> usb.core.Device:
 
+    found = wait_for_devices(idVendor, [(idProduct, port_numbers)], timeout)
+    if not found:
+        raise RenumerationFailed(f"Device {idVendor:04x}:{idProduct:04x} not found after {timeout}s")
+    return found[(idProduct, port_numbers)]
+
+
+def wait_for_devices(
+        idVendor: int,
+        targets: List[Tuple[int, Tuple]],
+        timeout: float = DEFAULT_RENUMERATION_TIMEOUT,
+        on_found: Optional[Callable[[Tuple[int, Tuple], usb.core.Device], None]] = None
+    ) -> Dict[Tuple[int, Tuple], usb.core.Device]:
+    '''
+    Wait for several (idProduct, port_numbers) devices with a single bus scan every 100 ms.
+    Returns the devices found before the timeout, keyed by (idProduct, port_numbers)
+    '''
+
+    registry = get_registry()
+    pending = set(targets)
+    found = {}
+
     start = time.time()
-    while time.time() - start < timeout:
-        dev = usb.core.find(
-            idVendor = idVendor, 
-            idProduct = idProduct,
-            backend = libusb_backend, 
-            custom_match = lambda d: d.port_numbers == port_numbers
+    while pending and time.time() - start < timeout:
+        devices = registry.find(
+            idVendor = idVendor,
+            custom_match = lambda d: (d.idProduct, d.port_numbers) in pending,
+            find_all = True
         )
-        if dev is not None:
-            return dev
-        
-        time.sleep(0.1) 
-    
-    raise RenumerationFailed(f"Device {idVendor:04x}:{idProduct:04x} not found after {timeout}s")
+        for dev in devices:
+            key = (dev.idProduct, dev.port_numbers)
+            found[key] = dev
+            pending.discard(key)
+            if on_found is not None:
+                on_found(key, dev)
 
+        if pending:
+            time.sleep(0.1)
+            # without hotplug notifications, the cache can't know the bus changed
+            if not registry.hotplug_active:
+                registry.invalidate()
 
-def renumerate(
-        PID: int, 
+    return found
+
+
+def load_firmware(
+        PID: int,
         port_numbers: Tuple,
-        firmware_file: str
-    ) -> usb.core.Device:
-    
-    dev = usb.core.find(
-        idVendor = THORLABS_VID, 
-        idProduct = PID, 
-        backend = libusb_backend, 
-        custom_match = lambda d: d.port_numbers == port_numbers
+        firmware_file: str,
+        firmware_cache_dir: Optional[Path] = None
+    ) -> None:
+    '''upload the firmware to an unprogrammed device, which then renumerates as PID+1'''
+
+    dev = get_registry().find(
+        idVendor = THORLABS_VID,
+        idProduct = PID,
+        port_numbers = port_numbers
     )
 
     if dev is None:
         raise DeviceNotFound
-    
-    firmware = parse_spt(firmware_file)
-    print('Uploading firmware...')
+
+    firmware = parse_spt(firmware_file, firmware_cache_dir)
+    logger.info('Uploading firmware %s to %04x:%04x on port %s', firmware_file, THORLABS_VID, PID, port_numbers)
     dev.set_configuration()
-    upload_firmware(dev, firmware)
+    transfers = upload_firmware(dev, firmware)
+    logger.debug('Firmware sent in %d control transfers (%d records)', transfers, len(firmware))
+
+
+def renumerate(
+        PID: int,
+        port_numbers: Tuple,
+        firmware_file: str,
+        firmware_cache_dir: Optional[Path] = None
+    ) -> usb.core.Device:
+
+    load_firmware(PID, port_numbers, firmware_file, firmware_cache_dir)
     new_dev = wait_for_device(
-        THORLABS_VID, 
-        PID+1, 
+        THORLABS_VID,
+        PID+1,
         port_numbers
     )
     return new_dev
@@ -948,6 +1705,88 @@ class DevInfo(NamedTuple):
     serial_number: str
 
 
+class RenumerationReport(NamedTuple):
+    pid: int
+    port_numbers: Tuple
+    device_info: Optional[DevInfo] # None if the device failed to renumerate
+    upload_time: float
+    renumeration_time: float # from the start of the upload until the device showed up again
+    error: Optional[BaseException]
+
+
+class RenumerationErrors(RenumerationFailed):
+
+    def __init__(self, reports: List[RenumerationReport], devices: Optional[List[DevInfo]] = None):
+        self.reports = reports
+        # spectrometers that are usable despite the failures
+        self.devices = [] if devices is None else devices
+        failed = [r for r in reports if r.error is not None]
+        details = ', '.join(f'{r.pid:04x} on port {r.port_numbers}: {r.error!r}' for r in failed)
+        super().__init__(f'{len(failed)} device(s) failed to renumerate: {details}')
+
+
+def renumerate_all(
+        devices: List[Tuple[int, Tuple]],
+        pid_firmware_map: Dict[int, Path],
+        timeout: float = DEFAULT_RENUMERATION_TIMEOUT,
+        firmware_cache_dir: Optional[Path] = None
+    ) -> List[RenumerationReport]:
+    '''
+    Upload firmware to all (PID, port_numbers) unprogrammed devices concurrently,
+    then wait for all of them to renumerate together.
+    '''
+
+    if not devices:
+        return []
+
+    start = time.time()
+
+    def upload(pid: int, port_numbers: Tuple) -> Tuple[float, Optional[BaseException]]:
+        try:
+            load_firmware(pid, port_numbers, pid_firmware_map[pid], firmware_cache_dir)
+            return time.time() - start, None
+        except Exception as e:
+            return time.time() - start, e
+
+    with ThreadPoolExecutor(max_workers=len(devices)) as executor:
+        uploads = list(executor.map(lambda d: upload(*d), devices))
+
+    uploaded = [(pid+1, port_numbers) for (pid, port_numbers), (_, error) in zip(devices, uploads) if error is None]
+    found_times = {}
+    found = wait_for_devices(
+        THORLABS_VID, 
+        uploaded, 
+        timeout, 
+        on_found = lambda key, dev: found_times.setdefault(key, time.time() - start)
+    )
+
+    reports = []
+    for (pid, port_numbers), (upload_time, error) in zip(devices, uploads):
+
+        device_info = None
+        renumeration_time = found_times.get((pid+1, port_numbers), time.time() - start)
+        new_dev = found.get((pid+1, port_numbers))
+        if new_dev is not None:
+            device_info = DevInfo(
+                vid = new_dev.idVendor,
+                pid = new_dev.idProduct,
+                serial_number = get_registry().serial_number(new_dev)
+            )
+        elif error is None:
+            error = RenumerationFailed(f"Device {THORLABS_VID:04x}:{pid+1:04x} not found after {timeout}s")
+
+        reports.append(RenumerationReport(
+            pid = pid,
+            port_numbers = port_numbers,
+            device_info = device_info,
+            upload_time = upload_time,
+            renumeration_time = renumeration_time,
+            error = error
+        ))
+
+    return reports
+
+
 DEFAULT_FIRMWARE_PATH = Path('ccs_firmware')
 DEFAULT_FIRMWARE_FILE = {
     CCS100_PID_U: DEFAULT_FIRMWARE_PATH / 'CCS100.spt',
@@ -957,40 +1796,57 @@ DEFAULT_FIRMWARE_FILE = {
     CCS200_PID_U: DEFAULT_FIRMWARE_PATH / 'CCS200.spt',
 }
 
-def list_spectrometers(pid_firmware_map: Dict[int, Path] = DEFAULT_FIRMWARE_FILE) -> List[DevInfo]:
-    '''list spectrometers in the CCS family. Uploads firmware if necessary'''
-    
-    devices = usb.core.find(
-        idVendor = THORLABS_VID, 
-        backend = libusb_backend, 
-        custom_match = lambda d: d.idProduct in range(*PID_RANGE),
+def list_spectrometers(
+        pid_firmware_map: Dict[int, Path] = DEFAULT_FIRMWARE_FILE,
+        timeout: float = DEFAULT_RENUMERATION_TIMEOUT,
+        firmware_cache_dir: Optional[Path] = None
+    ) -> List[DevInfo]:
+    '''
+    list spectrometers in the CCS family. Uploads firmware if necessary, to all
+    unprogrammed devices in parallel. Raises RenumerationErrors if any of them failed,
+    the spectrometers that are ready are listed in its devices attribute.
+    '''
+
+    registry = get_registry()
+    devices = registry.find(
+        idVendor = THORLABS_VID,
+        custom_match = lambda d: PID_RANGE[0] <= d.idProduct <= PID_RANGE[1],
         find_all = True
     )
 
     res = []
+    unprogrammed = []
     for dev in devices:
-        
+
         # device already initialized
         if dev.idProduct & 1:
             res.append(DevInfo(
                 vid = dev.idVendor,
                 pid = dev.idProduct,
-                serial_number = dev.serial_number 
+                serial_number = registry.serial_number(dev)
             ))
 
         # need to upload firmware
         else:
-            port_numbers = dev.port_numbers
-            new_dev = renumerate(
-                PID = dev.idProduct, 
-                firmware_file = pid_firmware_map[dev.idProduct],
-                port_numbers = port_numbers
-                )
-            res.append(DevInfo(
-                vid = new_dev.idVendor,
-                pid = new_dev.idProduct,
-                serial_number = new_dev.serial_number 
-            ))
+            unprogrammed.append((dev.idProduct, dev.port_numbers))
+
+    reports = renumerate_all(unprogrammed, pid_firmware_map, timeout, firmware_cache_dir)
+    for report in reports:
+        if report.error is None:
+            logger.info(
+                'Device %04x on port %s renumerated as %s in %.2fs (upload %.2fs)',
+                report.pid, report.port_numbers, report.device_info.serial_number,
+                report.renumeration_time, report.upload_time
+            )
+            res.append(report.device_info)
+        else:
+            logger.error(
+                'Device %04x on port %s failed to renumerate after %.2fs: %r',
+                report.pid, report.port_numbers, report.renumeration_time, report.error
+            )
+
+    if any(report.error is not None for report in reports):
+        raise RenumerationErrors(reports, res)
 
     return res
 
@@ -998,79 +1854,220 @@ class TLCCS:
 
     def __init__(
             self, 
-            device_info: DevInfo
+            device_info: DevInfo,
+            scan_timeout: Optional[float] = None,
+            correction_plan_cache_size: int = DEFAULT_CORRECTION_PLAN_CACHE_SIZE,
+            calibration_cache_dir: Optional[Path] = None
         ):
 
-        self.dev = usb.core.find(
+        self.dev = get_registry().find(
             idVendor = device_info.vid, 
             idProduct = device_info.pid, 
-            backend = libusb_backend,
-            custom_match = lambda d: d.serial_number == device_info.serial_number,
+            serial_number = device_info.serial_number
         )
 
         if self.dev is None:
             raise DeviceNotFound
 
+        self.device_info = device_info
         self.dev.set_configuration()
         self.dev.reset()  
 
         self.data = TLCCS_DATA()
-        initialize(self.dev, self.data)
+        initialize(
+            self.dev, 
+            self.data, 
+            calibration_cache_dir = calibration_cache_dir, 
+            serial_number = device_info.serial_number
+        )
+
+        # None: integration time + TLCCS_TIMEOUT_DEF, no timeout when waiting for an external trigger
+        self.scan_timeout = scan_timeout
+        self.last_scan_polls = 0
+        self._scan_start: Optional[float] = None
+        self._continuous = False
+        self._ext_trigger = False
+
+        self.correction_plan_cache_size = correction_plan_cache_size
+        self._correction_plans: OrderedDict = OrderedDict()
+        # reader threads get their plan while user threads ask for others
+        self._correction_plans_lock = threading.Lock()
+        self._user_amplitude_index: Optional[RangeMinMaxIndex] = None
 
-    def get_wavelength(self, factory_or_user: int = TLCCS_CAL_DATA_SET_FACTORY) -> array.array:
+    def get_wavelength(self, factory_or_user: int = TLCCS_CAL_DATA_SET_FACTORY) -> np.ndarray:
         return get_wavelength(self.data, factory_or_user)
 
     def start_single_scan(self):
         start_single_scan(self.dev)
+        self._scan_start = time.monotonic()
+        self._continuous = False
+        self._ext_trigger = False
 
     def start_continuous_scan(self):
         start_continuous_scan(self.dev)
+        self._scan_start = time.monotonic()
+        self._continuous = True
+        self._ext_trigger = False
+
+    def start_single_scan_ext_trigger(self):
+        start_single_scan_ext_trigger(self.dev)
+        self._scan_start = time.monotonic()
+        self._continuous = False
+        self._ext_trigger = True
+
+    def start_continuous_scan_ext_trigger(self):
+        start_continuous_scan_ext_trigger(self.dev)
+        self._scan_start = time.monotonic()
+        self._continuous = True
+        self._ext_trigger = True
+
+    @property
+    def continuous(self) -> bool:
+        '''a continuous scan is running: the next exposure starts while the last frame is read'''
+        return self._continuous
 
     def set_integration_time(self, integration_time: float):
-        set_integration_time(self.dev, integration_time)
+        # program the fixed point, so that data.int_time is what the device applies
+        self.data.int_time = quantize_integration_time(integration_time)
+        set_integration_time(self.dev, self.data.int_time)
 
     def get_integration_time(self) -> float:
-        return get_integration_time(self.dev)
+        self.data.int_time = get_integration_time(self.dev)
+        return self.data.int_time
+
+    def scan_wait_schedule(self, timeout: Optional[float] = None) -> Iterator[float]:
+        '''status poll schedule for the current scan, see scan_wait_schedule'''
+
+        if timeout is None:
+            timeout = self.scan_timeout
+        # waiting for an external trigger can take arbitrarily long
+        if timeout is None and not self._ext_trigger:
+            timeout = self.data.int_time + TLCCS_TIMEOUT_DEF / 1000
+
+        return scan_wait_schedule(self.data.int_time, self._scan_start, timeout)
+
+    def mark_scan_transferred(self, polls: int) -> None:
+
+        self.last_scan_polls = polls
+        # in continuous mode the next exposure follows the one we just waited for
+        self._scan_start = time.monotonic() if self._continuous else None
+
+    def wait_for_scan(
+            self,
+            timeout: Optional[float] = None,
+            stop_event: Optional[threading.Event] = None
+        ) -> Optional[int]:
+        '''
+        wait until the current scan is ready for transfer, returns the number of status polls,
+        or None if stop_event was set first
+        '''
+
+        polls = poll_scan_transfer(self.dev, self.scan_wait_schedule(timeout), stop_event)
+        if polls is not None:
+            self.mark_scan_transferred(polls)
+        return polls
     
-    def get_scan_data_factory(self) -> array.array:
-        status = 0x0000
-        while (status & TLCCS_STATUS_SCAN_TRANSFER) == 0:
-            status = get_device_status(self.dev) 
-        return get_scan_data_factory(self.dev, self.data)
+    def get_correction_plan(self, mode: int, *params: float) -> CorrectionPlan:
+        '''correction plan for a mode and its parameters, cached with LRU eviction'''
+
+        key = (mode,) + params
+        with self._correction_plans_lock:
+            plan = self._correction_plans.get(key)
+            if plan is not None:
+                self._correction_plans.move_to_end(key)
+                return plan
+
+        if mode == CORRECTION_MODE_NOISE:
+            # shares the index of the user amplitude correction between plans
+            plan = correction_plan_noise(self.data, *params, index=self.user_amplitude_index)
+        else:
+            plan = make_correction_plan(self.data, mode, *params)
+
+        with self._correction_plans_lock:
+            # another thread may have built it meanwhile, keep a single shared plan
+            plan = self._correction_plans.setdefault(key, plan)
+            self._correction_plans.move_to_end(key)
+            if len(self._correction_plans) > self.correction_plan_cache_size:
+                self._correction_plans.popitem(last=False)
+        return plan
+
+    def clear_correction_plans(self) -> None:
+        with self._correction_plans_lock:
+            self._correction_plans.clear()
+            self._user_amplitude_index = None
+
+    @property
+    def user_amplitude_index(self) -> RangeMinMaxIndex:
+
+        if self._user_amplitude_index is None:
+            self._user_amplitude_index = RangeMinMaxIndex(self.data.user_amplitude_cal.amplitude_cor)
+        return self._user_amplitude_index
+
+    def get_noise_ranges(
+            self,
+            center_wl: np.ndarray,
+            noise_amplification_dB: np.ndarray
+        ) -> Tuple[np.ndarray, np.ndarray]:
+        '''left/right wavelengths of the noise-corrected mode for many (center_wl, noise_amplification_dB) pairs'''
+
+        center_wl, noise_amplification_dB = np.broadcast_arrays(
+            np.asarray(center_wl, dtype=np.float64),
+            np.asarray(noise_amplification_dB, dtype=np.float64)
+        )
+        wl = np.asarray(self.data.factory_wavelength_cal.wl)
+        idx_center = first_indices_above(wl, center_wl, inclusive=True)
+        idx_left, idx_right, _, _ = find_centered_range_batch(
+            self.user_amplitude_index,
+            idx_center,
+            10**(noise_amplification_dB/10)
+        )
+        return wl[idx_left], wl[idx_right]
+
+    def get_raw_scan_data(self, raw: Optional[array.array] = None) -> np.ndarray:
+        self.wait_for_scan()
+        return get_raw_scan_data(self.dev, raw)
+
+    def get_scan_data_factory(
+            self,
+            as_ndarray: bool = True,
+            raw: Optional[array.array] = None,
+            out: Optional[np.ndarray] = None,
+            dtype: np.dtype = np.float64
+        ) -> Union[np.ndarray, array.array]:
+
+        plan = self.get_correction_plan(CORRECTION_MODE_FACTORY)
+        self.wait_for_scan()
+        return get_scan_data_corrected(self.dev, self.data, plan, as_ndarray, raw, out, dtype)
 
     def get_scan_data_corrected_range(
-            self, 
-            min_wl: float = 321.45, 
-            max_wl: float = 742.11
-        ) -> Tuple[array.array, float]:
-        
-        status = 0x0000
-        while (status & TLCCS_STATUS_SCAN_TRANSFER) == 0:
-            status = get_device_status(self.dev) 
-
-        return get_scan_data_corrected_range(
-            self.dev, 
-            self.data, 
-            min_wl = min_wl,
-            max_wl = max_wl
-        )
+            self,
+            min_wl: float = 321.45,
+            max_wl: float = 742.11,
+            as_ndarray: bool = True,
+            raw: Optional[array.array] = None,
+            out: Optional[np.ndarray] = None,
+            dtype: np.dtype = np.float64
+        ) -> Tuple[Union[np.ndarray, array.array], float]:
+
+        plan = self.get_correction_plan(CORRECTION_MODE_RANGE, min_wl, max_wl)
+        self.wait_for_scan()
+        scan_data = get_scan_data_corrected(self.dev, self.data, plan, as_ndarray, raw, out, dtype)
+        return scan_data, plan.noise_amplification_dB
 
     def get_scan_data_corrected_noise(
-            self, 
-            center_wl: float = 531.78, 
-            noise_amplification_dB: float = 1.0
-        ) -> Tuple[array.array, float, float]:
-        
-        status = 0x0000
-        while (status & TLCCS_STATUS_SCAN_TRANSFER) == 0:
-            status = get_device_status(self.dev) 
-
-        return get_scan_data_corrected_noise(
-            self.dev, 
-            self.data, 
-            center_wl = center_wl,
-            noise_amplification_dB = noise_amplification_dB
-        )
+            self,
+            center_wl: float = 531.78,
+            noise_amplification_dB: float = 1.0,
+            as_ndarray: bool = True,
+            raw: Optional[array.array] = None,
+            out: Optional[np.ndarray] = None,
+            dtype: np.dtype = np.float64
+        ) -> Tuple[Union[np.ndarray, array.array], float, float]:
+
+        plan = self.get_correction_plan(CORRECTION_MODE_NOISE, center_wl, noise_amplification_dB)
+        self.wait_for_scan()
+        scan_data = get_scan_data_corrected(self.dev, self.data, plan, as_ndarray, raw, out, dtype)
+        return scan_data, plan.wavelength_left, plan.wavelength_right
     
     def close(self):
         self.reset()
@@ -1080,6 +2077,7 @@ class TLCCS:
     
     def reset(self):
         reset_device(self.dev)
+        self._continuous = False
 
     def __enter__(self):
         return self
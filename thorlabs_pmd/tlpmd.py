@@ -1,23 +1,16 @@
-import usb.core
 import usbtmc
-import sys
+from thorlabs_usb import get_registry
 from typing import List, NamedTuple
 from enum import Enum, IntEnum
 from math import log10
 
-if sys.platform == 'win32':
-    import libusb_package
-    libusb_backend = libusb_package.get_libusb1_backend()
-else:
-    libusb_backend = None
-
 class DeviceNotFound(Exception): ...
 
 
 REN_CONTROL = 160 # Optional. Mechanism to enable or disable local controls on a device.
 GO_TO_LOCAL = 161 # Optional. Mechanism to enable local controls on a device. 
 THORLABS_VID = 0x1313
-PID_RANGE = (0x8078, 0x8079) # TODO check actual values
+PID_RANGE = (0x8078, 0x8079) # inclusive, TODO check actual values
 
 class DevInfo(NamedTuple):
     vid: int
@@ -26,10 +19,10 @@ class DevInfo(NamedTuple):
 
 def list_powermeters() -> List[DevInfo]:
     
-    devices = usb.core.find(
+    registry = get_registry()
+    devices = registry.find(
         idVendor = THORLABS_VID, 
-        backend = libusb_backend, 
-        custom_match = lambda d: d.idProduct in range(*PID_RANGE),
+        custom_match = lambda d: PID_RANGE[0] <= d.idProduct <= PID_RANGE[1],
         find_all = True
     )
 
@@ -38,7 +31,7 @@ def list_powermeters() -> List[DevInfo]:
         res.append(DevInfo(
             vid = dev.idVendor,
             pid = dev.idProduct,
-            serial_number = dev.serial_number 
+            serial_number = registry.serial_number(dev)
         ))
 
     return res
@@ -61,7 +54,17 @@ class TLPMD:
             device_info: DevInfo,
         ) -> None:
         
-        self.instr = usbtmc.Instrument(device_info.vid, device_info.pid, device_info.serial_number)
+        # the device from the shared registry, usbtmc would rescan the bus and reread serial numbers
+        dev = get_registry().find(
+            idVendor = device_info.vid,
+            idProduct = device_info.pid,
+            serial_number = device_info.serial_number
+        )
+
+        if dev is None:
+            raise DeviceNotFound
+
+        self.instr = usbtmc.Instrument(device = dev)
         self.instr.clear = lambda: None
         self.instr.open()
         self.remote_enable(1)
@@ -0,0 +1,260 @@
+import threading
+import time
+import logging
+import sys
+import usb.core
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+if sys.platform == 'win32':
+    import libusb_package
+    libusb_backend = libusb_package.get_libusb1_backend()
+else:
+    libusb_backend = None
+
+try:
+    import usb1 # optional, used for hotplug notifications
+except ImportError:
+    usb1 = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESCAN_INTERVAL = 1.0 # s, cache lifetime when hotplug is not available
+MIN_RESCAN_INTERVAL = 0.05 # s, lower bound between two bus scans
+
+class UsbDeviceInfo(NamedTuple):
+    vid: int
+    pid: int
+    serial_number: Optional[str]
+    port_numbers: Tuple
+    bus: int
+    address: int
+
+def _device_key(dev) -> Tuple[int, int, int, int]:
+    return (dev.bus, dev.address, dev.idVendor, dev.idProduct)
+
+def _port_numbers(dev) -> Tuple:
+    return tuple(dev.port_numbers or ())
+
+class UsbDeviceRegistry:
+    '''
+    Cache of the devices on the bus, shared by every lookup in thorlabs_ccs and thorlabs_pmd.
+    Enumeration only touches device descriptors; serial numbers (a control transfer each)
+    are read lazily, once per bus/address, and only for devices that match the other criteria.
+    The cache is refreshed on libusb hotplug events when python-libusb1 is installed,
+    otherwise when older than rescan_interval, or when a lookup comes up empty.
+    '''
+
+    def __init__(
+            self,
+            backend = libusb_backend,
+            rescan_interval: float = DEFAULT_RESCAN_INTERVAL,
+            hotplug: bool = True
+        ):
+
+        self.backend = backend
+        self.rescan_interval = rescan_interval
+
+        self._lock = threading.RLock()
+        self._devices: Dict[Tuple[int, int, int, int], usb.core.Device] = {}
+        self._static: Dict[Tuple[int, int, int, int], object] = {}
+        self._serial_numbers: Dict[Tuple[int, int, int, int], Optional[str]] = {}
+        self._last_scan = -float('inf')
+        self._dirty = True
+
+        self._hotplug_context = None
+        self._hotplug_thread = None
+        self._hotplug_stop = threading.Event()
+        if hotplug:
+            self._start_hotplug()
+
+    def _start_hotplug(self) -> None:
+
+        if usb1 is None:
+            return
+
+        try:
+            context = usb1.USBContext()
+            if not context.hasCapability(usb1.CAP_HAS_HOTPLUG):
+                context.close()
+                return
+            context.hotplugRegisterCallback(self._on_hotplug)
+        except Exception as e:
+            logger.debug('libusb hotplug not available: %s', e)
+            return
+
+        self._hotplug_context = context
+        self._hotplug_thread = threading.Thread(
+            target = self._hotplug_loop,
+            name = 'usb-hotplug',
+            daemon = True
+        )
+        self._hotplug_thread.start()
+
+    def _hotplug_loop(self) -> None:
+        while not self._hotplug_stop.is_set():
+            self._hotplug_context.handleEventsTimeout(tv=0.1)
+
+    def _on_hotplug(self, context, device, event) -> bool:
+        self.invalidate()
+        return False # keep the callback registered
+
+    @property
+    def hotplug_active(self) -> bool:
+        return self._hotplug_thread is not None
+
+    def invalidate(self) -> None:
+        '''force a bus scan on the next lookup'''
+        self._dirty = True
+
+    def refresh(self, force: bool = False) -> bool:
+        '''rescan the bus if the cache is stale (or if force), returns True if a scan happened'''
+
+        with self._lock:
+            age = time.monotonic() - self._last_scan
+            stale = self._dirty or (not self.hotplug_active and age > self.rescan_interval)
+            if not (stale or force) or age < MIN_RESCAN_INTERVAL:
+                return False
+
+            self._dirty = False
+            try:
+                found = usb.core.find(find_all = True, backend = self.backend)
+            except usb.core.NoBackendError:
+                # static devices are still usable without libusb
+                if not self._static:
+                    raise
+                found = []
+
+            devices = {}
+            for dev in found:
+                key = _device_key(dev)
+                # keep the existing object, it may already be configured by its owner
+                devices[key] = self._devices.get(key, dev)
+
+            for key in self._devices.keys() - devices.keys():
+                self._serial_numbers.pop(key, None)
+
+            self._devices = devices
+            self._last_scan = time.monotonic()
+            return True
+
+    def register(self, dev) -> None:
+        '''add a static device (e.g. a simulated spectrometer), not subject to bus scans'''
+        with self._lock:
+            self._static[_device_key(dev)] = dev
+
+    def unregister(self, dev) -> None:
+        with self._lock:
+            key = _device_key(dev)
+            self._static.pop(key, None)
+            self._serial_numbers.pop(key, None)
+
+    def serial_number(self, dev) -> Optional[str]:
+        '''serial number of the device, read from the device once and cached'''
+
+        key = _device_key(dev)
+        with self._lock:
+            if key in self._serial_numbers:
+                return self._serial_numbers[key]
+
+        try:
+            serial_number = dev.serial_number
+        except (ValueError, NotImplementedError, usb.core.USBError) as e:
+            # no permission or no string descriptor
+            logger.debug('could not read serial number of %04x:%04x: %s', dev.idVendor, dev.idProduct, e)
+            serial_number = None
+
+        with self._lock:
+            self._serial_numbers[key] = serial_number
+        return serial_number
+
+    def devices(self) -> List:
+        self.refresh()
+        with self._lock:
+            return list(self._devices.values()) + list(self._static.values())
+
+    def _match(
+            self,
+            idVendor: Optional[int],
+            idProduct: Optional[int],
+            serial_number: Optional[str],
+            port_numbers: Optional[Tuple],
+            custom_match: Optional[Callable],
+        ) -> List:
+
+        res = []
+        for dev in self.devices():
+            if idVendor is not None and dev.idVendor != idVendor:
+                continue
+            if idProduct is not None and dev.idProduct != idProduct:
+                continue
+            if port_numbers is not None and _port_numbers(dev) != tuple(port_numbers):
+                continue
+            if custom_match is not None and not custom_match(dev):
+                continue
+            if serial_number is not None and self.serial_number(dev) != serial_number:
+                continue
+            res.append(dev)
+        return res
+
+    def find(
+            self,
+            idVendor: Optional[int] = None,
+            idProduct: Optional[int] = None,
+            serial_number: Optional[str] = None,
+            port_numbers: Optional[Tuple] = None,
+            custom_match: Optional[Callable] = None,
+            find_all: bool = False
+        ) -> Union[Optional[usb.core.Device], List[usb.core.Device]]:
+        '''
+        Same semantics as usb.core.find, served from the cache. The serial number is only
+        compared (and read) after all other criteria matched. An empty result triggers one
+        rate-limited rescan.
+        '''
+
+        res = self._match(idVendor, idProduct, serial_number, port_numbers, custom_match)
+        if not res and self.refresh(force=True):
+            res = self._match(idVendor, idProduct, serial_number, port_numbers, custom_match)
+
+        if find_all:
+            return res
+        return res[0] if res else None
+
+    def list(
+            self,
+            idVendor: Optional[int] = None,
+            custom_match: Optional[Callable] = None
+        ) -> List[UsbDeviceInfo]:
+        '''matching devices with their serial number'''
+
+        return [
+            UsbDeviceInfo(
+                vid = dev.idVendor,
+                pid = dev.idProduct,
+                serial_number = self.serial_number(dev),
+                port_numbers = _port_numbers(dev),
+                bus = dev.bus,
+                address = dev.address
+            )
+            for dev in self.find(idVendor = idVendor, custom_match = custom_match, find_all = True)
+        ]
+
+    def close(self) -> None:
+
+        if self._hotplug_thread is not None:
+            self._hotplug_stop.set()
+            self._hotplug_thread.join()
+            self._hotplug_thread = None
+            self._hotplug_context.close()
+            self._hotplug_context = None
+
+_registry: Optional[UsbDeviceRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> UsbDeviceRegistry:
+    '''process-wide registry, created on first use'''
+
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = UsbDeviceRegistry()
+        return _registry